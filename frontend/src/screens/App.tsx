@@ -648,9 +648,29 @@ function App() {
                 });
               }
             }
+          } else if (parsed.type === "response_chunk") {
+            // Streamed answer text: grow a single in-progress response event.
+            const idx = newEvents.findIndex((ev) => ev.id === "response" && ev.status === "inProgress");
+            if (idx !== -1) {
+              newEvents[idx] = { ...newEvents[idx], detail: newEvents[idx].detail + parsed.data };
+            } else {
+              newEvents.push({
+                id: "response",
+                title: "Response",
+                detail: parsed.data,
+                status: "inProgress",
+              });
+            }
+          } else if (parsed.type === "response_reset") {
+            // The streamed text was a hand-off after all: drop the preview.
+            const idx = newEvents.findIndex((ev) => ev.id === "response" && ev.status === "inProgress");
+            if (idx !== -1) {
+              newEvents.splice(idx, 1);
+            }
           } else if (parsed.type === "response") {
             // When a response is received, update any non-input, non-response events (including pending) to green.
-            const updatedEvents = newEvents.map((ev) => {
+            // The streamed preview is replaced by the final response.
+            const updatedEvents = newEvents.filter((ev) => !(ev.id === "response" && ev.status === "inProgress")).map((ev) => {
               if (ev.id !== "input" && ev.id !== "response" && ev.status !== "progress_finished") {
                 return { ...ev, status: "progress_finished" };
               }
@@ -1,4 +1,13 @@
 import os
+import asyncio
+import logging
+import time
+
+from web3.exceptions import TransactionNotFound
+
+import chain
+import metrics
+from budget import MAX_HOPS
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -76,23 +85,24 @@ agent_abi = [
 	}
 ]
 
-def call_contract_function(w3, wallet, input, original, hops, logger, to):
+RECEIPT_POLL_INTERVAL = float(os.getenv("RECEIPT_POLL_INTERVAL", 2))
+RECEIPT_TIMEOUT = float(os.getenv("RECEIPT_TIMEOUT", 600))
+
+def send_contract_function(w3, wallet, input, original, hops, logger, to, max_hops=MAX_HOPS):
+    """
+    Build, sign and broadcast a requestData transaction. Returns the tx hash
+    without waiting for it to be mined.
+    """
+    agent = w3.eth.contract(address=to, abi=agent_abi)
+    agent_function = agent.functions.requestData(w3.to_checksum_address(wallet), input, max_hops, original, hops)
+    
+    tx_hash = chain.send_transaction(w3, agent_function, os.getenv('WALLET_ADDR'), os.getenv('WALLET_PKEY'))
+    logger.info(f"Transaction sent: {tx_hash.hex()}")
+    return tx_hash
+
+def call_contract_function(w3, wallet, input, original, hops, logger, to, max_hops=MAX_HOPS):
     try:
-        agent = w3.eth.contract(address=to, abi=agent_abi)
-        agent_function = agent.functions.requestData(w3.to_checksum_address(wallet), input, 20, original, hops)
-        
-        nonce = w3.eth.get_transaction_count(os.getenv('WALLET_ADDR'))
-        tx = agent_function.build_transaction({
-            'from': os.getenv('WALLET_ADDR'),
-            'gas': 2000000,
-            'gasPrice': w3.eth.gas_price,
-            'nonce': nonce,
-            'chainId': w3.eth.chain_id
-        })
-        
-        signed_tx = w3.eth.account.sign_transaction(tx, os.getenv('WALLET_PKEY'))
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        logger.info(f"Transaction sent: {tx_hash.hex()}")
+        tx_hash = send_contract_function(w3, wallet, input, original, hops, logger, to, max_hops)
         
         logger.info("Waiting for transaction confirmation...")
         receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
@@ -100,4 +110,91 @@ def call_contract_function(w3, wallet, input, original, hops, logger, to):
         
     except Exception as e:
         logger.error(f"[bold red]Failed to call contract function: {e}[/]")
-        logger.exception("Exception occurred while calling contract function.")
\ No newline at end of file
+        logger.exception("Exception occurred while calling contract function.")
+
+
+class ReceiptWatcher:
+    """
+    Tracks broadcast transactions in the background and resolves a future
+    with each receipt once it is mined. Reverted transactions and ones not
+    mined within `timeout` seconds fail the future instead.
+    """
+    def __init__(self, w3, poll_interval=RECEIPT_POLL_INTERVAL, timeout=RECEIPT_TIMEOUT):
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.pending = {}
+        self.task = None
+        self.logger = logging.getLogger("receipts")
+
+    def track(self, tx_hash, callback=None, on_failure=None):
+        """
+        Return a future for the receipt of `tx_hash`. `callback(receipt)` is
+        called on success and `on_failure(error)` on a revert or timeout, if
+        given.
+        """
+        future = asyncio.get_running_loop().create_future()
+        def on_done(f):
+            if f.cancelled():
+                return
+            # Reading the exception also keeps asyncio from reporting it as
+            # never retrieved when nobody awaits the future
+            error = f.exception()
+            if error is None:
+                if callback is not None:
+                    callback(f.result())
+            elif on_failure is not None:
+                on_failure(error)
+        future.add_done_callback(on_done)
+        self.pending[tx_hash] = (future, time.monotonic())
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.watch())
+        return future
+
+    async def watch(self):
+        while self.pending:
+            await asyncio.sleep(self.poll_interval)
+            for tx_hash, (future, sent_at) in list(self.pending.items()):
+                try:
+                    receipt = await asyncio.to_thread(self.w3.eth.get_transaction_receipt, tx_hash)
+                except TransactionNotFound:
+                    if time.monotonic() - sent_at > self.timeout:
+                        del self.pending[tx_hash]
+                        self.logger.error(f"Transaction {tx_hash.hex()} not mined after {self.timeout}s")
+                        if not future.done():
+                            future.set_exception(TimeoutError(f"Transaction {tx_hash.hex()} not mined after {self.timeout}s"))
+                    continue
+                except Exception as e:
+                    self.logger.warning(f"Receipt lookup for {tx_hash.hex()} failed: {e}")
+                    continue
+                del self.pending[tx_hash]
+                metrics.observe("receipt", time.monotonic() - sent_at)
+                if future.done():
+                    continue
+                if receipt['status'] != 1:
+                    self.logger.error(f"Transaction reverted: {tx_hash.hex()}")
+                    future.set_exception(RuntimeError(f"Transaction {tx_hash.hex()} reverted"))
+                else:
+                    future.set_result(receipt)
+
+receipt_watchers = {}
+
+def get_receipt_watcher(w3):
+    if id(w3) not in receipt_watchers:
+        receipt_watchers[id(w3)] = ReceiptWatcher(w3)
+    return receipt_watchers[id(w3)]
+
+async def submit_contract_function(w3, wallet, input, original, hops, logger, to, callback=None, max_hops=MAX_HOPS,
+                                   on_failure=None):
+    """
+    Non-blocking `call_contract_function`: returns a future for the receipt
+    as soon as the transaction is broadcast, or None if sending failed.
+    `callback` and `on_failure` are passed on to `ReceiptWatcher.track`.
+    """
+    try:
+        tx_hash = await asyncio.to_thread(send_contract_function, w3, wallet, input, original, hops, logger, to, max_hops)
+    except Exception as e:
+        logger.error(f"[bold red]Failed to call contract function: {e}[/]")
+        logger.exception("Exception occurred while calling contract function.")
+        return None
+    return get_receipt_watcher(w3).track(tx_hash, callback, on_failure)
@@ -0,0 +1,129 @@
+"""
+Agent Index
+-----------
+Embedding index over agent descriptions, used to offer the LLM only the
+AGENT_INDEX_TOP_K agents most relevant to a query instead of every agent.
+
+Vectors live in memory as a NumPy matrix and are persisted to
+AGENT_INDEX_PATH with a hash of the text they were built from, so restarts
+and registry reloads only embed agents that are new or changed. The saved
+vectors are read by `load()`, which `oracle.start()` calls.
+"""
+
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+import db
+import embeddings
+
+logger = logging.getLogger("agent_index")
+
+AGENT_INDEX_PATH = os.getenv("AGENT_INDEX_PATH", "agent_index.npz")
+AGENT_INDEX_TOP_K = int(os.getenv("AGENT_INDEX_TOP_K", 8))
+
+
+def agent_text(agent):
+    return f"{agent.get('name', agent['id'])}: {agent['description']}"
+
+def text_hash(text):
+    # Include the model so switching EMBEDDING_MODEL re-embeds everything
+    return hashlib.sha1(f"{embeddings.EMBEDDING_MODEL}\n{text}".encode("utf-8")).hexdigest()
+
+
+class AgentIndex:
+    def __init__(self, registry, path=AGENT_INDEX_PATH, top_k=AGENT_INDEX_TOP_K):
+        self.registry = registry
+        self.path = path
+        self.top_k = top_k
+        self.ids = []
+        self.hashes = []
+        self.vectors = None
+        # Agents seen in the registry or db.add_agent but not embedded yet
+        self.pending = {}
+        registry.on_change(self.on_registry_change)
+        db.on_agent_added(self.on_agent_added)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as saved:
+                self.ids = [str(id) for id in saved["ids"]]
+                self.hashes = [str(h) for h in saved["hashes"]]
+                self.vectors = saved["vectors"] if saved["vectors"].size else None
+            logger.info(f"Loaded {len(self.ids)} agent vectors from {self.path}")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable agent index {self.path}: {e}")
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, ids=np.array(self.ids), hashes=np.array(self.hashes), vectors=self.vectors if self.vectors is not None else np.zeros((0, 0), dtype=np.float32))
+        os.replace(tmp_path, self.path)
+
+    def on_registry_change(self, agents):
+        # May run on the Firestore listener thread: only record the work here.
+        self.pending = {a["id"]: a for a in agents}
+
+    def on_agent_added(self, id, agent):
+        self.pending[id] = {**agent, "id": id}
+
+    async def sync(self):
+        """
+        Embed pending agents whose text is new or changed and drop agents that
+        left the registry.
+        """
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        known = dict(zip(self.ids, self.hashes))
+        changed = [a for a in pending.values() if known.get(a["id"]) != text_hash(agent_text(a))]
+
+        changed_ids = {a["id"] for a in changed}
+        keep = [i for i, id in enumerate(self.ids)
+                if id not in changed_ids and (id in pending or self.registry.get_by_id(id) is not None)]
+        ids = [self.ids[i] for i in keep]
+        hashes = [self.hashes[i] for i in keep]
+        vectors = self.vectors[keep] if self.vectors is not None and keep else None
+
+        if changed:
+            try:
+                new_vectors = await embeddings.embed([agent_text(a) for a in changed])
+            except Exception as e:
+                logger.warning(f"Failed to embed {len(changed)} agents, retrying later: {e}")
+                self.pending.update({a["id"]: a for a in changed})
+                return
+            ids += [a["id"] for a in changed]
+            hashes += [text_hash(agent_text(a)) for a in changed]
+            vectors = new_vectors if vectors is None else np.vstack([vectors, new_vectors])
+
+        if ids != self.ids or changed:
+            self.ids, self.hashes, self.vectors = ids, hashes, vectors
+            self.save()
+            logger.info(f"Agent index holds {len(ids)} agents ({len(changed)} embedded).")
+
+    async def candidates(self, query, excluded_ids):
+        """
+        Ids of the top-k agents for `query`, skipping `excluded_ids`.
+        Returns None when every agent fits anyway or the index can't answer,
+        meaning "offer them all".
+        """
+        await self.sync()
+        if self.vectors is None or len(self.ids) - len(excluded_ids) <= self.top_k:
+            return None
+        try:
+            query_vector = await embeddings.embed_one(query)
+        except Exception as e:
+            logger.warning(f"Query embedding failed, offering all agents: {e}")
+            return None
+        scores = self.vectors @ query_vector
+        result = set()
+        for i in np.argsort(-scores):
+            if self.ids[i] not in excluded_ids:
+                result.add(self.ids[i])
+                if len(result) == self.top_k:
+                    break
+        return result
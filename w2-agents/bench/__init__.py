@@ -0,0 +1,3 @@
+"""
+Offline benchmark harness for the oracle; see bench/run.py.
+"""
@@ -0,0 +1,125 @@
+"""
+Benchmark Clients
+-----------------
+Drives the `/ws` endpoint like the frontend does and times every message,
+then turns the traces into throughput, latency percentiles and a per-stage
+breakdown:
+
+- submit:    socket opened -> request_started (request tx broadcast)
+- pickup:    request_started -> first progress_started (mined, log delivered, dispatched)
+- agents:    time agents spent between their progress_started and progress_finished
+- transit:   progress_finished -> next agent's progress_started (hand-off tx and delivery)
+- answer:    last progress_started -> response (the answering agent)
+- ttft:      socket opened -> first response_chunk
+- total:     socket opened -> response
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+import websockets
+from web3 import Web3
+
+STAGES = ["submit", "pickup", "agents", "transit", "answer", "ttft", "total"]
+
+
+class Trace:
+    def __init__(self, wallet, input):
+        self.wallet = wallet
+        self.input = input
+        self.started = time.perf_counter()
+        self.events = []
+        self.error = None
+
+    def record(self, kind, agent=None):
+        self.events.append((kind, agent, time.perf_counter() - self.started))
+
+    def first(self, kind):
+        return next((t for k, _, t in self.events if k == kind), None)
+
+    def stages(self):
+        """
+        Seconds spent in each stage; stages a request never reached are None.
+        """
+        total = self.first("response")
+        started = [(agent, t) for kind, agent, t in self.events if kind == "progress_started"]
+        finished = {agent: t for kind, agent, t in self.events if kind == "progress_finished"}
+        agents = sum(finished[agent] - t for agent, t in started if agent in finished)
+        transit = 0.0
+        for agent, t in started[1:]:
+            previous = [f for f in finished.values() if f <= t]
+            if previous:
+                transit += t - max(previous)
+        submitted = self.first("request_started")
+        return {
+            "submit": submitted,
+            "pickup": started[0][1] - submitted if started and submitted is not None else None,
+            "agents": agents if started else None,
+            "transit": transit if len(started) > 1 else None,
+            "answer": total - started[-1][1] if total is not None and started else None,
+            "ttft": self.first("response_chunk"),
+            "total": total,
+        }
+
+
+async def run_request(url, wallet, input, timeout):
+    trace = Trace(wallet, input)
+
+    async def converse(ws):
+        await ws.send(json.dumps({"input": input, "wallet": wallet}))
+        async for message in ws:
+            parsed = json.loads(message)
+            data = parsed.get("data")
+            agent = data.get("current_agent") if isinstance(data, dict) else None
+            trace.record(parsed["type"], agent["id"] if agent else None)
+            if parsed["type"] == "response":
+                return
+
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            await asyncio.wait_for(converse(ws), timeout)
+    except Exception as e:
+        trace.error = f"{type(e).__name__}: {e}"
+    return trace
+
+async def run_client(url, index, requests, timeout, traces):
+    """
+    One user: a wallet of its own sending `requests` queries back to back.
+    """
+    wallet = Web3.to_checksum_address(os.urandom(20))
+    for n in range(requests):
+        traces.append(await run_request(url, wallet, f"Benchmark query {index}-{n}", timeout))
+
+async def run_clients(url, clients, requests, timeout):
+    """
+    Run `clients` concurrent users. Returns (traces, wall clock seconds).
+    """
+    traces = []
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(url, i, requests, timeout, traces) for i in range(clients)))
+    return traces, time.perf_counter() - started
+
+
+def percentiles(values):
+    if not values:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "mean": float(np.mean(values))}
+
+def summarize(traces, elapsed):
+    completed = [trace for trace in traces if trace.error is None and trace.first("response") is not None]
+    hops = sum(len([e for e in trace.events if e[0] == "progress_started"]) for trace in completed)
+    stages = {stage: percentiles([s[stage] for s in map(Trace.stages, completed) if s[stage] is not None])
+              for stage in STAGES}
+    return {
+        "requests": len(traces),
+        "completed": len(completed),
+        "errors": sorted({trace.error for trace in traces if trace.error}),
+        "elapsed": elapsed,
+        "requests_per_second": len(completed) / elapsed if elapsed else 0.0,
+        "hops_per_second": hops / elapsed if elapsed else 0.0,
+        "stages": stages,
+    }
@@ -0,0 +1,109 @@
+"""
+Local EVM
+---------
+A chain for benchmarks: an anvil node (started here when `anvil` is on the
+PATH, or already running at a given URL) or, failing that, an in-process
+eth-tester chain. Agent.sol is compiled with py-solc-x (SOLC_VERSION is
+installed on first use) and one contract is deployed per agent.
+
+AgentFactory.sol is not deployed: its `requestDataViaAgent` still calls the
+old two-argument `requestData` and no longer compiles against Agent.sol, and
+the oracle only ever talks to the Agent contracts. The checked-in Agent
+artifact predates the max_hops/hops event, so it isn't used either.
+"""
+
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import time
+from pathlib import Path
+
+from web3 import Web3
+
+import chain
+
+logger = logging.getLogger("bench.evm")
+
+CONTRACTS_DIR = Path(__file__).resolve().parents[2] / "w3-contracts"
+SOLC_VERSION = os.getenv("SOLC_VERSION", "0.8.24")
+# First default account of anvil (and hardhat), funded on every local node
+ANVIL_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+DEPLOY_GAS = 1_000_000
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def compile_agent():
+    """
+    ABI and bytecode of Agent.sol.
+    """
+    import solcx
+    if SOLC_VERSION not in {str(v) for v in solcx.get_installed_solc_versions()}:
+        solcx.install_solc(SOLC_VERSION)
+    compiled = solcx.compile_files([CONTRACTS_DIR / "Agent.sol"], output_values=["abi", "bin"], solc_version=SOLC_VERSION)
+    contract = next(value for key, value in compiled.items() if key.endswith(":Agent"))
+    return contract["abi"], contract["bin"]
+
+
+class LocalChain:
+    """
+    `w3` is a synchronous connection; `rpc_url`/`ws_url` are None for the
+    in-process chain, which the app then has to share through `w3`.
+    """
+    def __init__(self, w3, private_key, rpc_url=None, ws_url=None, process=None):
+        self.w3 = w3
+        self.private_key = private_key
+        self.address = w3.eth.account.from_key(private_key).address
+        self.rpc_url = rpc_url
+        self.ws_url = ws_url
+        self.process = process
+
+    @classmethod
+    def start(cls, rpc_url=None, block_time=None):
+        if rpc_url:
+            return cls(Web3(Web3.HTTPProvider(rpc_url)), ANVIL_KEY, rpc_url, rpc_url.replace("http", "ws", 1))
+        if shutil.which("anvil"):
+            port = free_port()
+            command = ["anvil", "--port", str(port), "--silent"]
+            if block_time:
+                command += ["--block-time", str(block_time)]
+            process = subprocess.Popen(command)
+            rpc_url = f"http://127.0.0.1:{port}"
+            w3 = Web3(Web3.HTTPProvider(rpc_url))
+            for _ in range(100):
+                if process.poll() is not None:
+                    raise RuntimeError("anvil exited during startup")
+                try:
+                    if w3.is_connected():
+                        break
+                except Exception:
+                    pass
+                time.sleep(0.1)
+            logger.info(f"Started anvil on port {port}")
+            return cls(w3, ANVIL_KEY, rpc_url, f"ws://127.0.0.1:{port}", process)
+
+        from web3 import EthereumTesterProvider
+        provider = EthereumTesterProvider()
+        key = provider.ethereum_tester.backend.account_keys[0].to_hex()
+        logger.info("anvil not found, using an in-process eth-tester chain")
+        return cls(Web3(provider), key)
+
+    def deploy_agents(self, count):
+        """
+        Deploy `count` Agent contracts. Returns their addresses.
+        """
+        abi, bytecode = compile_agent()
+        contract = self.w3.eth.contract(abi=abi, bytecode=bytecode)
+        tx_hashes = [chain.send_transaction(self.w3, contract.constructor(), self.address, self.private_key, gas=DEPLOY_GAS)
+                     for _ in range(count)]
+        return [self.w3.eth.wait_for_transaction_receipt(tx_hash)["contractAddress"] for tx_hash in tx_hashes]
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Oracle Benchmark
+----------------
+Runs the whole pipeline offline: a local EVM with one Agent contract per
+agent, stub OpenAI and Places servers, an in-memory SQLite registry and the
+real FastAPI app and oracle, driven by N concurrent `/ws` clients.
+
+Run from w2-agents/:
+
+    python -m bench.run --clients 20 --requests 5 --hops 3 --llm-latency 0.5
+    python -m bench.run --rpc-url http://127.0.0.1:8545 --json results.json
+
+Any app setting (FAST_ROUTE_MODE, OFFCHAIN_HOPS, CONFIRMATION_DEPTH, ...)
+can be set in the environment as usual; the benchmark only fills in the
+endpoints, wallet and storage it provides.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+
+from rich.console import Console
+from rich.logging import RichHandler
+from rich.table import Table
+
+logging.basicConfig(level=logging.WARNING, format="%(message)s", handlers=[RichHandler()])
+logger = logging.getLogger("bench")
+console = Console()
+
+
+async def serve(app, port):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", ws_max_size=2 ** 24))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+def configure(args, local_chain, stub_port, workdir):
+    """
+    Point the app at the benchmark's chain, stubs and scratch files. Must run
+    before any app module reads its settings at import.
+    """
+    defaults = {
+        "WALLET_ADDR": local_chain.address,
+        "WALLET_PKEY": local_chain.private_key,
+        "IRIS_STORAGE": "sqlite",
+        "IRIS_SQLITE_PATH": ":memory:",
+        "ORACLE_JOURNAL_PATH": os.path.join(workdir, "oracle_journal.db"),
+        "AGENT_INDEX_PATH": os.path.join(workdir, "agent_index.npz"),
+        "FAST_ROUTE_LOG": os.path.join(workdir, "fast_route.jsonl"),
+        "HOP_LEDGER_PATH": os.path.join(workdir, "hop_ledger.jsonl"),
+        # Routing is scripted by the LLM stub
+        "FAST_ROUTE_MODE": "off",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+        "GOOGLE_MAPS_API_KEY": "bench",
+        "PLACES_API_URL": f"http://127.0.0.1:{stub_port}/maps/api/place/textsearch/json",
+        "MAX_HOPS": str(args.hops + 1),
+    }
+    if args.fanout > 1:
+        defaults["FANOUT"] = "1"
+    if local_chain.rpc_url:
+        defaults["RPC_URL"] = local_chain.rpc_url
+        defaults["ALCHEMY_WS_URL"] = local_chain.ws_url
+    else:
+        defaults["EVENT_SOURCE"] = "poll"
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+def agent_documents(addresses, places):
+    agents = {}
+    for i, address in enumerate(addresses):
+        if places and i == len(addresses) - 1:
+            agents["google_maps"] = {"name": "Google Maps", "description": "Finds places and addresses", "address": address}
+        else:
+            agents[f"agent_{i}"] = {"name": f"Agent {i}", "description": f"Benchmark specialist number {i}",
+                                    "address": address, "accuracy": 50 + i % 50}
+    return agents
+
+def report(summary, stub_requests):
+    console.print(f"[bold]{summary['completed']}/{summary['requests']} requests in {summary['elapsed']:.2f}s[/] "
+                  f"({summary['requests_per_second']:.2f} requests/s, {summary['hops_per_second']:.2f} hops/s)")
+    console.print(f"Stub calls: {stub_requests}")
+    for error in summary["errors"]:
+        console.print(f"[bold red]{error}[/]")
+
+    table = Table(title="Latency per stage (seconds)")
+    for column in ("stage", "p50", "p95", "p99", "mean"):
+        table.add_column(column, justify="left" if column == "stage" else "right")
+    for stage, values in summary["stages"].items():
+        if values is None:
+            table.add_row(stage, "-", "-", "-", "-")
+        else:
+            table.add_row(stage, *(f"{values[key]:.3f}" for key in ("p50", "p95", "p99", "mean")))
+    console.print(table)
+
+
+async def main(args):
+    from bench.evm import LocalChain, free_port
+    from bench.stubs import StubConfig, create_app
+    from bench import clients
+
+    local_chain = LocalChain.start(args.rpc_url, args.block_time)
+    workdir = tempfile.mkdtemp(prefix="iris-bench-")
+    stub_port = free_port()
+    configure(args, local_chain, stub_port, workdir)
+    try:
+        addresses = local_chain.deploy_agents(args.agents + (1 if args.places else 0))
+        os.environ.setdefault("GATEWAY_ADDR", addresses[0])
+
+        # App modules read their settings at import, so only now
+        import db
+        import websocket
+        from context import context
+
+        db.add_agents(agent_documents(addresses, args.places))
+        if local_chain.rpc_url is None:
+            context.w3 = local_chain.w3
+
+        stub_app = create_app(StubConfig(args.llm_latency, args.token_latency, args.places_latency,
+                                         args.jitter, args.hops, args.fanout))
+        stub_server, stub_task = await serve(stub_app, stub_port)
+        app_port = free_port()
+        app_server, app_task = await serve(websocket.app, app_port)
+
+        try:
+            traces, elapsed = await clients.run_clients(f"ws://127.0.0.1:{app_port}/ws", args.clients,
+                                                        args.requests, args.timeout)
+        finally:
+            app_server.should_exit = True
+            stub_server.should_exit = True
+            await asyncio.gather(app_task, stub_task, return_exceptions=True)
+
+        summary = clients.summarize(traces, elapsed)
+        report(summary, stub_app.state.requests)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"config": vars(args), "summary": summary, "stub_requests": stub_app.state.requests}, f, indent=2)
+    finally:
+        local_chain.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the oracle offline.")
+    parser.add_argument("--clients", type=int, default=10, help="concurrent users")
+    parser.add_argument("--requests", type=int, default=3, help="requests per user, sent back to back")
+    parser.add_argument("--agents", type=int, default=8, help="LLM agents to deploy")
+    parser.add_argument("--hops", type=int, default=3, help="agents each request visits")
+    parser.add_argument("--fanout", type=int, default=1, help="agents called per hand-off")
+    parser.add_argument("--places", action="store_true", help="end every chain at a google_maps agent")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="stub LLM time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="stub LLM time between tokens (s)")
+    parser.add_argument("--places-latency", type=float, default=0.2, help="stub Places latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="relative latency jitter")
+    parser.add_argument("--rpc-url", help="use a running node instead of starting anvil")
+    parser.add_argument("--block-time", type=float, help="anvil block time (default: mine every tx)")
+    parser.add_argument("--timeout", type=float, default=300, help="per-request timeout (s)")
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,152 @@
+"""
+Stub OpenAI and Places APIs
+---------------------------
+One FastAPI app that stands in for the OpenAI chat/embeddings endpoints and
+the Places text search, with configurable latency, so the oracle can be
+benchmarked without network access or API spend.
+
+Chat completions follow a fixed script: an agent hands off to the first
+offered tool until the request has visited `hops` agents (counted from the
+"NOT ALLOWED TOOLS" list in the system prompt), then answers. If a
+`google_maps` agent is offered, the last hand-off goes to it so the Places
+stub is exercised too. With `fanout` > 1 every other hand-off calls that
+many tools at once. Answers are streamed word by word, `token_latency`
+apart.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import time
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_DIM = 64
+
+
+class StubConfig:
+    def __init__(self, llm_latency=0.5, token_latency=0.01, places_latency=0.2, jitter=0.1, hops=3, fanout=1):
+        self.llm_latency = llm_latency
+        self.token_latency = token_latency
+        self.places_latency = places_latency
+        self.jitter = jitter
+        self.hops = hops
+        self.fanout = fanout
+
+    async def delay(self, seconds):
+        await asyncio.sleep(max(0.0, seconds * (1 + random.uniform(-self.jitter, self.jitter))))
+
+
+def visited(messages):
+    """
+    Agents already on the request's path, from the system prompt.
+    """
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    if "NOT ALLOWED TOOLS:" not in system:
+        return 1
+    names = system.split("NOT ALLOWED TOOLS:", 1)[1].split(".", 1)[0]
+    return len([name for name in names.split(",") if name.strip()])
+
+def embedding(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def completion_chunk(delta, finish_reason=None, usage=None):
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "gpt-4o",
+        "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        "usage": usage,
+    }
+
+
+def create_app(config):
+    app = FastAPI()
+    app.state.config = config
+    app.state.requests = {"chat": 0, "embeddings": 0, "places": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests["chat"] += 1
+        await config.delay(config.llm_latency)
+
+        tools = [tool["function"]["name"] for tool in body.get("tools") or []]
+        query = body["messages"][-1]["content"]
+        if tools and visited(body["messages"]) < config.hops:
+            # The last hand-off goes to the Places agent when there is one
+            if visited(body["messages"]) == config.hops - 1 and "google_maps" in tools:
+                targets = ["google_maps"]
+            else:
+                targets = ([name for name in tools if name != "google_maps"] or tools)[:config.fanout]
+            calls = [{"index": i, "id": f"call_{i}", "type": "function",
+                      "function": {"name": name, "arguments": json.dumps({"input": query})}}
+                     for i, name in enumerate(targets)]
+            deltas = [{"role": "assistant", "tool_calls": calls}]
+            finish_reason = "tool_calls"
+        else:
+            words = f"Benchmark answer after {visited(body['messages'])} hops to: {query}".split(" ")
+            deltas = [{"role": "assistant", "content": words[0]}] + [{"content": " " + word} for word in words[1:]]
+            finish_reason = "stop"
+        usage = {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": None, "tool_calls": None}
+            for delta in deltas:
+                if "content" in delta:
+                    message["content"] = (message["content"] or "") + delta["content"]
+                if "tool_calls" in delta:
+                    message["tool_calls"] = [{k: v for k, v in call.items() if k != "index"} for call in delta["tool_calls"]]
+            return JSONResponse({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "gpt-4o",
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+
+        async def events():
+            for delta in deltas:
+                yield f"data: {json.dumps(completion_chunk(delta))}\n\n"
+                if "content" in delta:
+                    await config.delay(config.token_latency)
+            yield f"data: {json.dumps(completion_chunk({}, finish_reason))}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps(completion_chunk({}, usage=usage))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        app.state.requests["embeddings"] += 1
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        return {
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-small"),
+            "data": [{"object": "embedding", "index": i, "embedding": embedding(text)} for i, text in enumerate(texts)],
+            "usage": {"prompt_tokens": len(texts), "total_tokens": len(texts)},
+        }
+
+    @app.get("/maps/api/place/textsearch/json")
+    async def places(query: str = ""):
+        app.state.requests["places"] += 1
+        await config.delay(config.places_latency)
+        return {
+            "status": "OK",
+            "results": [
+                {"name": f"Place {i} for {query}", "formatted_address": f"{i} Bench Street",
+                 "rating": 4.5, "user_ratings_total": 10 * i}
+                for i in range(1, 6)
+            ],
+        }
+
+    return app
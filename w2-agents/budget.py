@@ -0,0 +1,54 @@
+"""
+Request Budgets
+---------------
+Bounds what a single user request can spend before it must be answered.
+
+- Hops: every request carries `max_hops` on chain, MAX_HOPS for new
+  requests. Each hand-off passes on one less, and the agent that receives
+  the last hop answers itself.
+- Tokens: with REQUEST_TOKEN_BUDGET set, LLM tokens are counted per request
+  and the agent holding it answers once the budget is spent.
+- Time: with REQUEST_TIME_BUDGET set (seconds), the agent holding a request
+  older than that answers it.
+
+Token counts live in memory and start over after a restart.
+"""
+
+import logging
+import os
+import time
+
+logger = logging.getLogger("budget")
+
+MAX_HOPS = int(os.getenv("MAX_HOPS", 20))
+REQUEST_TOKEN_BUDGET = int(os.getenv("REQUEST_TOKEN_BUDGET", 0))
+REQUEST_TIME_BUDGET = float(os.getenv("REQUEST_TIME_BUDGET", 0))
+
+
+class BudgetTracker:
+    def __init__(self, token_budget=REQUEST_TOKEN_BUDGET, time_budget=REQUEST_TIME_BUDGET):
+        self.token_budget = token_budget
+        self.time_budget = time_budget
+        self.tokens = {}
+
+    def charge(self, request_id, tokens):
+        if request_id is not None and tokens:
+            self.tokens[request_id] = self.tokens.get(request_id, 0) + tokens
+
+    def forget(self, request_id):
+        self.tokens.pop(request_id, None)
+
+    def exhausted(self, request, max_hops):
+        """
+        Why the request can't be handed on any further, or None if it can.
+        `request` is the journal entry, if there is one.
+        """
+        if max_hops <= 1:
+            return "hop limit reached"
+        if request is None:
+            return None
+        if self.token_budget and self.tokens.get(request["request_id"], 0) >= self.token_budget:
+            return f"{self.tokens[request['request_id']]} of {self.token_budget} tokens spent"
+        if self.time_budget and time.time() - request["created_at"] >= self.time_budget:
+            return f"older than {self.time_budget:g}s"
+        return None
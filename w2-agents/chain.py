@@ -0,0 +1,135 @@
+"""
+Chain Helpers
+-------------
+Shared transaction plumbing for every sender of the oracle wallet.
+
+Nonces are handed out locally so several transactions can be in flight at
+once, `chain_id` is fetched once per process and the gas price is cached for
+GAS_PRICE_TTL seconds.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger("chain")
+
+GAS_PRICE_TTL = float(os.getenv("GAS_PRICE_TTL", 10))
+DEFAULT_GAS = 2000000
+SEND_RETRIES = 3
+
+
+class ChainParams:
+    def __init__(self, w3, gas_price_ttl=GAS_PRICE_TTL):
+        self.w3 = w3
+        self.gas_price_ttl = gas_price_ttl
+        self.lock = threading.Lock()
+        self._chain_id = None
+        self._gas_price = None
+        self._gas_price_at = 0
+
+    def chain_id(self):
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        return self._chain_id
+
+    def gas_price(self):
+        with self.lock:
+            if self._gas_price is None or time.monotonic() - self._gas_price_at > self.gas_price_ttl:
+                self._gas_price = self.w3.eth.gas_price
+                self._gas_price_at = time.monotonic()
+            return self._gas_price
+
+
+class NonceManager:
+    """
+    Sequential nonce allocator for one sending address. The first allocation
+    (and the first one after `resync`) reads the pending transaction count.
+    """
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self.lock = threading.Lock()
+        self.next_nonce = None
+
+    def allocate(self):
+        with self.lock:
+            if self.next_nonce is None:
+                self.next_nonce = self.w3.eth.get_transaction_count(self.address, "pending")
+            nonce = self.next_nonce
+            self.next_nonce += 1
+            return nonce
+
+    def resync(self):
+        with self.lock:
+            self.next_nonce = None
+
+
+chain_params = {}
+nonce_managers = {}
+registry_lock = threading.Lock()
+
+def get_chain_params(w3):
+    with registry_lock:
+        if id(w3) not in chain_params:
+            chain_params[id(w3)] = ChainParams(w3)
+        return chain_params[id(w3)]
+
+def get_nonce_manager(w3, address):
+    # Keyed by address only: every provider sees the same account nonce.
+    key = address.lower()
+    with registry_lock:
+        if key not in nonce_managers:
+            nonce_managers[key] = NonceManager(w3, address)
+        return nonce_managers[key]
+
+
+def send_transaction(w3, contract_function, wallet_address, private_key, gas=DEFAULT_GAS):
+    """
+    Build, sign and broadcast `contract_function` from `wallet_address` with a
+    locally allocated nonce. Returns the tx hash.
+
+    A "nonce too low" or "replacement transaction underpriced" rejection means
+    another transaction holds the nonce, so the allocator resyncs and retries
+    with a fresh one; a plain "transaction underpriced" retries the same nonce
+    with a higher gas price.
+    """
+    with metrics.stage("send_transaction"):
+        return _send_transaction(w3, contract_function, wallet_address, private_key, gas)
+
+def _send_transaction(w3, contract_function, wallet_address, private_key, gas):
+    params = get_chain_params(w3)
+    nonces = get_nonce_manager(w3, wallet_address)
+    nonce = nonces.allocate()
+    gas_price = params.gas_price()
+    for attempt in range(SEND_RETRIES):
+        tx = contract_function.build_transaction({
+            'from': wallet_address,
+            'gas': gas,
+            'gasPrice': gas_price,
+            'nonce': nonce,
+            'chainId': params.chain_id()
+        })
+        signed_tx = w3.eth.account.sign_transaction(tx, private_key)
+        try:
+            return w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        except Exception as e:
+            message = str(e).lower()
+            if "already known" in message:
+                return signed_tx.hash
+            if attempt + 1 < SEND_RETRIES and ("nonce too low" in message
+                                               or "replacement transaction underpriced" in message):
+                logger.warning(f"Nonce {nonce} already used, resyncing.")
+                nonces.resync()
+                nonce = nonces.allocate()
+                continue
+            if attempt + 1 < SEND_RETRIES and "underpriced" in message:
+                # Below the node's minimum price; 12.5% clears its bump rule too.
+                gas_price = int(gas_price * 1.125) + 1
+                logger.warning(f"Gas price too low for nonce {nonce}, retrying at {gas_price}.")
+                continue
+            nonces.resync()
+            raise
@@ -0,0 +1,115 @@
+"""
+Application Context
+-------------------
+Owns the process-wide connections and background work, so importing any
+module stays free of network calls and side effects.
+
+Clients are created on first use (`get_w3()`, `db.get_db()`,
+`http_client.get_client()`) and shared by every module. `start()` loads the
+agent registry, resumes unfinished hops from the journal and launches the
+event source; `stop()` tears everything down
+and flushes pending writes. Call `start()` after forking a worker, never
+before.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from rich.logging import RichHandler
+from rich.traceback import install
+from web3 import Web3
+
+import metrics
+
+logger = logging.getLogger("context")
+
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", 30))
+
+
+def rpc_url():
+    return os.getenv("RPC_URL") or f"https://eth-sepolia.g.alchemy.com/v2/{os.getenv('ALCHEMY_API_KEY')}"
+
+def configure_logging():
+    install()
+    logging.basicConfig(level=logging.INFO, format="%(message)s", handlers=[RichHandler()])
+
+
+class AppContext:
+    def __init__(self):
+        self.w3 = None
+        self.tasks = []
+        self.started = False
+
+    def get_w3(self):
+        """
+        Shared synchronous Web3 connection, created on first use.
+        """
+        if self.w3 is None:
+            self.w3 = Web3(Web3.HTTPProvider(rpc_url()))
+            self.w3.middleware_onion.add(metrics.RPCMetrics)
+            logger.info("Connected to Web3 provider.")
+        return self.w3
+
+    async def start(self):
+        if self.started:
+            return
+        self.started = True
+        configure_logging()
+
+        # Imported here because these modules use the context themselves
+        import db
+        import events
+        import oracle
+
+        # A hard exit still commits buffered agent writes
+        atexit.register(db.agent_writes.flush)
+        await asyncio.to_thread(oracle.registry.start)
+        await asyncio.to_thread(oracle.start)
+        oracle.resume_pending()
+        self.tasks.append(asyncio.create_task(events.run(oracle.process_log)))
+        if oracle.hop_ledger is not None:
+            self.tasks.append(asyncio.create_task(oracle.hop_ledger.run()))
+        logger.info("Application context started.")
+
+    async def stop(self):
+        if not self.started:
+            return
+        import db
+        import http_client
+        import oracle
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+        try:
+            await asyncio.wait_for(oracle.dispatcher.drain(), timeout=SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"{len(oracle.dispatcher.tasks)} hops still running at shutdown.")
+        # Fan-outs still waiting on branches can't complete any more
+        for task in list(oracle.fanouts.tasks):
+            task.cancel()
+        if oracle.hop_ledger is not None:
+            try:
+                await asyncio.wait_for(oracle.hop_ledger.settle(), timeout=SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                # Still logged as unsettled, so the next start retries them
+                logger.warning("Hop settlement still unconfirmed at shutdown.")
+        oracle.registry.stop()
+        oracle.journal.close()
+        await db.async_agent_writes.flush()
+        await http_client.aclose()
+        self.started = False
+        logger.info("Application context stopped.")
+
+
+context = AppContext()
+
+def get_w3():
+    return context.get_w3()
@@ -6,29 +6,206 @@ from firebase_admin import credentials
 import os
 import json
 import base64
+import asyncio
+import logging
+import threading
 
-base64_credentials = os.environ.get("GOOGLE_API_B64")
-decoded_credentials = base64.b64decode(base64_credentials).decode('utf-8')
-cred_dict = json.loads(decoded_credentials)
+import storage
 
-cred = credentials.Certificate("cred.json")
-app = firebase_admin.initialize_app(cred)
-db = firestore.client()
+logger = logging.getLogger("db")
+
+app = None
+db = None
+init_lock = threading.Lock()
+
+def get_db():
+    """
+    Firestore client, initialised on first use and shared by the process.
+    """
+    global app, db
+    if db is None:
+        with init_lock:
+            if db is None:
+                base64_credentials = os.environ.get("GOOGLE_API_B64")
+                decoded_credentials = base64.b64decode(base64_credentials).decode('utf-8')
+                cred_dict = json.loads(decoded_credentials)
+
+                cred = credentials.Certificate("cred.json")
+                app = firebase_admin.initialize_app(cred)
+                db = firestore.client()
+    return db
+
+agent_added_listeners = []
+
+def on_agent_added(callback):
+    """
+    Call `callback(id, agent)` for every agent written by `add_agent` or
+    `add_agents` in this process.
+    """
+    agent_added_listeners.append(callback)
+
+store = None
+
+def get_store():
+    """
+    Agent storage backend selected by IRIS_STORAGE (default firestore).
+    """
+    global store
+    if store is None:
+        with init_lock:
+            if store is None:
+                store = storage.create_store(os.getenv("IRIS_STORAGE", "firestore"), get_db)
+    return store
 
 def add_agent(id, agent):
     """
     Add an agent to the database.
     """
-    db.collection("agents").document(id).set(agent)
+    get_store().add_agents({id: agent})
+    for callback in agent_added_listeners:
+        callback(id, agent)
+    
+def add_agents(agents):
+    """
+    Add many agents, given as {id: agent}, with batched writes.
+    """
+    get_store().add_agents(agents)
+    for id, agent in agents.items():
+        for callback in agent_added_listeners:
+            callback(id, agent)
     
 def list_agent() -> list:
     """
     List the agent in the database.
     """
-    agents = db.collection("agents").stream()
-    agent_list = []
-    for agent in agents:
-        new_dict = agent.to_dict()
-        new_dict["id"] = agent.id
-        agent_list.append(new_dict)
-    return agent_list
\ No newline at end of file
+    return get_store().list_agent()
+
+def get_agent(id):
+    return get_store().get_by_id(id)
+
+def get_agent_by_address(address):
+    return get_store().get_by_address(address)
+
+def watch_agents(callback):
+    """
+    Call `callback(agent_list)` with the full agent list on every change to
+    the collection. Returns the watch; call `unsubscribe()` on it to stop.
+    Raises NotImplementedError for backends without change feeds.
+    """
+    return get_store().watch(callback)
+
+
+WRITE_BUFFER_SIZE = int(os.getenv("WRITE_BUFFER_SIZE", 200))
+WRITE_BUFFER_INTERVAL = float(os.getenv("WRITE_BUFFER_INTERVAL", 5))
+
+class WriteBuffer:
+    """
+    Coalesces agent writes and commits them as one batched write once
+    `max_size` documents are pending or `interval` seconds after the first
+    pending write. Several updates to one document become a single write.
+    Safe to use from multiple threads. The application context flushes
+    pending writes at shutdown and registers `flush` to run at exit.
+    A failed commit puts its writes back to be retried with the next flush.
+    """
+    def __init__(self, max_size=WRITE_BUFFER_SIZE, interval=WRITE_BUFFER_INTERVAL):
+        self.max_size = max_size
+        self.interval = interval
+        self.lock = threading.Lock()
+        # id -> (data, merge)
+        self.pending = {}
+        self.timer = None
+
+    def _add(self, id, data, merge):
+        with self.lock:
+            if merge and id in self.pending:
+                previous, previous_merge = self.pending[id]
+                self.pending[id] = ({**previous, **data}, previous_merge)
+            else:
+                self.pending[id] = (data, merge)
+            self._schedule()
+            return len(self.pending) >= self.max_size
+
+    def _schedule(self):
+        # Caller holds the lock
+        if self.timer is None:
+            self.timer = threading.Timer(self.interval, self._flush_later)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _flush_later(self):
+        try:
+            self.flush()
+        except Exception:
+            # Already logged, and the writes are queued for the next flush
+            pass
+
+    def set(self, id, data, flush=True):
+        """
+        Buffer a full overwrite of document `id`.
+        """
+        if self._add(id, data, merge=False) and flush:
+            self.flush()
+
+    def update(self, id, fields, flush=True):
+        """
+        Buffer a merge of `fields` into document `id`.
+        """
+        if self._add(id, fields, merge=True) and flush:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if pending:
+            try:
+                get_store().write(pending)
+            except Exception as e:
+                logger.error(f"Failed to write {len(pending)} agent documents, keeping them buffered: {e}")
+                self._restore(pending)
+                raise
+        return len(pending)
+
+    def _restore(self, failed):
+        """
+        Put back writes that failed to commit, under any buffered since.
+        """
+        with self.lock:
+            for id, (data, merge) in self.pending.items():
+                if merge and id in failed:
+                    previous, previous_merge = failed[id]
+                    failed[id] = ({**previous, **data}, previous_merge)
+                else:
+                    failed[id] = (data, merge)
+            self.pending = failed
+            self._schedule()
+
+class AsyncWriteBuffer:
+    """
+    Event-loop friendly front for a WriteBuffer: buffering never blocks and
+    commits run in a worker thread.
+    """
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    async def set(self, id, data):
+        if self.buffer._add(id, data, merge=False):
+            await self.flush()
+
+    async def update(self, id, fields):
+        if self.buffer._add(id, fields, merge=True):
+            await self.flush()
+
+    async def flush(self):
+        return await asyncio.to_thread(self.buffer.flush)
+
+agent_writes = WriteBuffer()
+async_agent_writes = AsyncWriteBuffer(agent_writes)
+
+def update_agent(id, fields):
+    """
+    Merge `fields` into an agent document through the write buffer.
+    """
+    agent_writes.update(id, fields)
@@ -0,0 +1,73 @@
+"""
+Hop Dispatcher
+--------------
+Runs agent hops concurrently instead of inline in the log listener.
+
+Hops for the same user run strictly in the order they were submitted, while
+different users' hops run in parallel, bounded by a global cap and a
+per-agent cap so one busy agent cannot take every slot.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+import metrics
+
+logger = logging.getLogger("dispatcher")
+
+
+class Dispatcher:
+    def __init__(self, max_concurrent=None, max_per_agent=None):
+        self.max_concurrent = max_concurrent or int(os.getenv("MAX_CONCURRENT_HOPS", 32))
+        self.max_per_agent = max_per_agent or int(os.getenv("MAX_CONCURRENT_PER_AGENT", 4))
+        self.global_limit = asyncio.Semaphore(self.max_concurrent)
+        self.agent_limits = {}
+        # Last submitted task per user; each new task waits on it.
+        self.user_tails = {}
+        self.tasks = set()
+
+    def agent_limit(self, agent):
+        key = agent.lower()
+        if key not in self.agent_limits:
+            self.agent_limits[key] = asyncio.Semaphore(self.max_per_agent)
+        return self.agent_limits[key]
+
+    def submit(self, user, agent, coro_fn, *args):
+        """
+        Schedule `coro_fn(*args)` as a hop of `agent` on behalf of `user`.
+        Returns the task; callers don't need to await it.
+        """
+        key = user.lower()
+        previous = self.user_tails.get(key)
+        task = asyncio.create_task(self._run(previous, agent, coro_fn, args, time.perf_counter()))
+        self.user_tails[key] = task
+        self.tasks.add(task)
+        task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    async def _run(self, previous, agent, coro_fn, args, submitted):
+        if previous is not None:
+            # Only ordering matters here; the previous hop's failure was
+            # already logged by its own done callback.
+            await asyncio.wait([previous])
+        # Per-agent slot first, so hops queued behind a busy agent don't
+        # sit on global slots other agents could use.
+        async with self.agent_limit(agent), self.global_limit:
+            metrics.observe("dispatch_wait", time.perf_counter() - submitted)
+            return await coro_fn(*args)
+
+    def _done(self, key, task):
+        self.tasks.discard(task)
+        if self.user_tails.get(key) is task:
+            del self.user_tails[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Hop for {key} failed", exc_info=task.exception())
+
+    async def drain(self):
+        """
+        Wait for every submitted hop to finish.
+        """
+        while self.tasks:
+            await asyncio.wait(list(self.tasks))
@@ -0,0 +1,39 @@
+"""
+Text embeddings through the shared OpenAI client, as unit-length NumPy vectors.
+"""
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+import http_client
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_MEMO_SIZE = int(os.getenv("EMBEDDING_MEMO_SIZE", 256))
+
+# Recent single-text embeddings; the response cache and agent index often
+# embed the same query within one hop.
+memo = OrderedDict()
+
+
+async def embed(texts):
+    """
+    Embed a list of strings. Returns a (len(texts), dim) float32 array whose
+    rows are normalised, so a dot product is the cosine similarity.
+    """
+    response = await http_client.get_openai().embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+async def embed_one(text):
+    if text in memo:
+        memo.move_to_end(text)
+        return memo[text]
+    vector = (await embed([text]))[0]
+    memo[text] = vector
+    if len(memo) > EMBEDDING_MEMO_SIZE:
+        memo.popitem(last=False)
+    return vector
@@ -0,0 +1,189 @@
+"""
+Event Source
+------------
+Delivers IRISRequestAgentData logs to the oracle as soon as they are mined.
+
+Preferred transport is an `eth_subscribe("logs")` websocket subscription
+filtered by the IRIS topic. Providers that do not support subscriptions fall
+back to an `eth_newFilter` / `eth_getFilterChanges` poll, and if filters are
+unavailable too we fall back to the block-range scan in `oracle`.
+
+With CONFIRMATION_DEPTH=0 logs are handled as soon as they arrive, and logs
+the node later reports as `removed` (reorged out) have their queued hops
+dropped. A `newHeads` subscription alongside moves the checkpoint forward
+even while no IRIS logs are mined. With a positive depth, new heads only
+trigger a range scan up to `head - CONFIRMATION_DEPTH`, which first checks
+the recorded block hashes and rewinds past any reorg.
+"""
+
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from web3 import AsyncWeb3, AsyncHTTPProvider, Web3, WebSocketProvider
+
+import metrics
+import oracle
+from context import rpc_url
+
+logger = logging.getLogger("events")
+
+FILTER_POLL_INTERVAL = float(os.getenv("FILTER_POLL_INTERVAL", 2))
+BLOCK_POLL_INTERVAL = float(os.getenv("BLOCK_POLL_INTERVAL", 0.2))
+RECONNECT_DELAY = float(os.getenv("EVENTS_RECONNECT_DELAY", 1))
+MAX_RECONNECT_DELAY = float(os.getenv("EVENTS_MAX_RECONNECT_DELAY", 30))
+# "poll" skips subscriptions and filters, e.g. for in-process test chains
+EVENT_SOURCE = os.getenv("EVENT_SOURCE", "auto")
+
+
+def ws_url():
+    return os.getenv("ALCHEMY_WS_URL") or f"wss://eth-sepolia.g.alchemy.com/v2/{os.getenv('ALCHEMY_API_KEY')}"
+
+def connect(provider):
+    w3 = AsyncWeb3(provider)
+    w3.middleware_onion.add(metrics.RPCMetrics)
+    return w3
+
+
+async def handle(handler, log):
+    """
+    Hand a single log to the oracle without letting a bad event kill the stream.
+    """
+    if log.get('removed'):
+        oracle.orphan_log(log)
+        return
+    try:
+        await handler(log)
+    except Exception as e:
+        logger.exception(f"Failed to handle log {log.get('transactionHash')}: {e}")
+    # Every log of earlier blocks has been delivered by now; the current block
+    # may still have more logs coming, so it stays unprocessed.
+    oracle.advance_checkpoint(log['blockNumber'] - 1)
+
+async def catch_up(w3, handler, head=None):
+    """
+    Scan everything between the last processed block and the confirmed head,
+    rewinding first if the chain was reorganised.
+    Returns the block that is now fully processed.
+    """
+    await asyncio.to_thread(oracle.check_reorg)
+    target = oracle.confirmed_head(await w3.eth.block_number if head is None else head)
+    if target > oracle.last_block_processed:
+        logger.info(f"Catching up blocks {oracle.last_block_processed + 1} to {target}")
+        logs = await asyncio.to_thread(oracle.get_logs_in_range, oracle.last_block_processed + 1, target)
+        for log in logs:
+            await handle(handler, log)
+        block = await w3.eth.get_block(target)
+        oracle.advance_checkpoint(target, Web3.to_hex(block["hash"]))
+    return target
+
+async def subscribe_logs(handler):
+    if oracle.CONFIRMATION_DEPTH > 0:
+        return await subscribe_heads(handler)
+    async with connect(WebSocketProvider(ws_url())) as w3:
+        subscription_id = await w3.eth.subscribe("logs", {"topics": [oracle.IRIS_EVENT_SIGNATURE]})
+        heads_id = await w3.eth.subscribe("newHeads")
+        logger.info(f"Subscribed to IRIS logs ({subscription_id}) and new heads ({heads_id})")
+
+        # Subscribe first, then catch up, so nothing mined in between is lost.
+        caught_up_to = await catch_up(w3, handler)
+        try:
+            async for message in w3.socket.process_subscriptions():
+                if message["subscription"] == heads_id:
+                    # The parent's logs were all delivered before this head
+                    head = message["result"]
+                    oracle.advance_checkpoint(head["number"] - 1, Web3.to_hex(head["parentHash"]))
+                    continue
+                log = message["result"]
+                if log['blockNumber'] <= caught_up_to and not log.get('removed'):
+                    continue
+                await handle(handler, log)
+        except Exception as e:
+            # Errors after setup mean the socket dropped, not that
+            # subscriptions are unsupported.
+            logger.warning(f"Log subscription ended: {e}")
+
+async def subscribe_heads(handler):
+    """
+    Scan each newly confirmed range as heads arrive.
+    """
+    async with connect(WebSocketProvider(ws_url())) as w3:
+        subscription_id = await w3.eth.subscribe("newHeads")
+        logger.info(f"Subscribed to new heads ({subscription_id}), confirming {oracle.CONFIRMATION_DEPTH} blocks deep")
+
+        await catch_up(w3, handler)
+        try:
+            async for message in w3.socket.process_subscriptions():
+                await catch_up(w3, handler, message["result"]["number"])
+        except Exception as e:
+            logger.warning(f"Head subscription ended: {e}")
+
+async def poll_filter(handler):
+    if oracle.CONFIRMATION_DEPTH > 0:
+        # Filter changes are unconfirmed; poll confirmed ranges instead
+        return await poll_confirmed(handler)
+    w3 = connect(AsyncHTTPProvider(rpc_url()))
+    log_filter = await w3.eth.filter({"topics": [oracle.IRIS_EVENT_SIGNATURE]})
+    logger.info(f"Polling IRIS logs with filter {log_filter.filter_id}")
+
+    caught_up_to = await catch_up(w3, handler)
+    try:
+        while True:
+            # Changes are reported per imported block, so once they are read
+            # every block up to this head has been delivered.
+            head = await w3.eth.get_block("latest")
+            for log in await w3.eth.get_filter_changes(log_filter.filter_id):
+                if log['blockNumber'] <= caught_up_to and not log.get('removed'):
+                    continue
+                await handle(handler, log)
+            oracle.advance_checkpoint(head["number"], Web3.to_hex(head["hash"]))
+            await asyncio.sleep(FILTER_POLL_INTERVAL)
+    except Exception as e:
+        # Usually an expired filter; the caller installs a fresh one.
+        logger.warning(f"Log filter ended: {e}")
+    finally:
+        try:
+            await w3.eth.uninstall_filter(log_filter.filter_id)
+        except Exception:
+            pass
+
+async def poll_confirmed(handler):
+    w3 = connect(AsyncHTTPProvider(rpc_url()))
+    logger.info(f"Polling confirmed blocks, {oracle.CONFIRMATION_DEPTH} deep")
+    while True:
+        await catch_up(w3, handler)
+        await asyncio.sleep(FILTER_POLL_INTERVAL)
+
+async def poll_blocks():
+    while True:
+        await oracle.listen_for_contract_requests()
+        await asyncio.sleep(BLOCK_POLL_INTERVAL)
+
+async def run(handler=None):
+    """
+    Stream IRIS logs into `handler` forever, reconnecting with backoff and
+    degrading from subscriptions to filters to block polling as needed.
+    """
+    handler = handler or oracle.process_log
+    if EVENT_SOURCE == "poll":
+        return await poll_blocks()
+    delay = RECONNECT_DELAY
+    while True:
+        for source in (subscribe_logs, poll_filter):
+            try:
+                await source(handler)
+                # The source ended on its own (socket closed); reconnect.
+                delay = RECONNECT_DELAY
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Event source {source.__name__} unavailable: {e}")
+        else:
+            logger.warning("No push or filter support, falling back to block polling.")
+            await poll_blocks()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MAX_RECONNECT_DELAY)
@@ -0,0 +1,206 @@
+"""
+Agent Fan-out
+-------------
+With FANOUT=1, a hop whose model answers with several tool calls hands the
+request to all of those agents at once (up to FANOUT_MAX_BRANCHES) instead
+of only the first, and the branches run in parallel.
+
+Branches are identified by their hop path: each one shares the path up to
+and including the agent that fanned out, followed by its own first agent.
+A branch's final answer is collected by its group instead of resolving the
+user's request. When every branch has answered, or FANOUT_DEADLINE seconds
+have passed, the group merges whatever it has with FANOUT_AGGREGATOR:
+
+- first:     the first answer to arrive, without waiting for the rest
+- synthesis: one LLM call that merges the answers into a single reply
+- vote:      the answer with the most weight behind it, where an agent's
+             weight is its `weight` field, 1 by default. Answers only agree
+             if they match word for word (ignoring case and spacing), so
+             this is for agents prompted to give short categorical answers
+             (yes/no, a label, a number); use synthesis for free text
+
+Closed groups are kept for FANOUT_TOMBSTONE_TTL seconds so a branch that
+answers after its group has merged (a "first" group, or one past its
+deadline) is recognised and dropped instead of answering the wallet's next
+request.
+
+Groups live in memory; after a restart a branch answers the user directly.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger("fanout")
+
+FANOUT = os.getenv("FANOUT", "0") == "1"
+FANOUT_MAX_BRANCHES = int(os.getenv("FANOUT_MAX_BRANCHES", 4))
+FANOUT_DEADLINE = float(os.getenv("FANOUT_DEADLINE", 60))
+FANOUT_AGGREGATOR = os.getenv("FANOUT_AGGREGATOR", "synthesis")
+FANOUT_TOMBSTONE_TTL = float(os.getenv("FANOUT_TOMBSTONE_TTL", 600))
+
+
+def normalise(text):
+    return " ".join(text.lower().split())
+
+
+class FanOut:
+    def __init__(self, wallet, path, branches, original, aggregator=FANOUT_AGGREGATOR, deadline=FANOUT_DEADLINE):
+        self.wallet = wallet.lower()
+        self.path = [a.lower() for a in path]
+        self.branches = [b.lower() for b in branches]
+        self.original = original
+        self.aggregator = aggregator
+        self.deadline = deadline
+        self.started = time.monotonic()
+        # Branch address -> answer, in arrival order
+        self.responses = {}
+        # Branches whose hops raised; they will never answer
+        self.failed = set()
+        self.complete = asyncio.Event()
+        # Set once the group has merged its answers; later ones are dropped
+        self.closed_at = None
+
+    def branch_of(self, path):
+        """
+        The branch a hop path belongs to, or None if it's not inside this group.
+        """
+        depth = len(self.path)
+        if len(path) <= depth or [a.lower() for a in path[:depth]] != self.path:
+            return None
+        branch = path[depth].lower()
+        return branch if branch in self.branches else None
+
+    def add(self, branch, text):
+        if branch in self.responses:
+            return
+        self.responses[branch] = text
+        logger.info(f"Fan-out for {self.wallet}: {len(self.responses)}/{len(self.branches)} branches answered "
+                    f"after {time.monotonic() - self.started:.2f}s")
+        if self.aggregator == "first" or len(self.responses) + len(self.failed) == len(self.branches):
+            self.complete.set()
+
+    def fail(self, branch):
+        """
+        Stop waiting for `branch`, which failed without answering.
+        """
+        branch = branch.lower()
+        if branch in self.responses or branch in self.failed:
+            return
+        self.failed.add(branch)
+        logger.warning(f"Fan-out branch {branch} for {self.wallet} failed")
+        if len(self.responses) + len(self.failed) == len(self.branches):
+            self.complete.set()
+
+    async def wait(self):
+        try:
+            await asyncio.wait_for(self.complete.wait(), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            logger.warning(f"Fan-out for {self.wallet} hit its {self.deadline}s deadline with "
+                           f"{len(self.responses)}/{len(self.branches)} answers")
+        return dict(self.responses)
+
+
+class FanOutTracker:
+    """
+    Open fan-out groups per wallet, and recently closed ones.
+    """
+    def __init__(self, tombstone_ttl=FANOUT_TOMBSTONE_TTL):
+        self.groups = {}
+        self.closed = {}
+        self.tombstone_ttl = tombstone_ttl
+        self.tasks = set()
+
+    def open(self, wallet, path, branches, original, collect):
+        """
+        Start a group and schedule `collect(group)` to merge its answers.
+        """
+        group = FanOut(wallet, path, branches, original)
+        self.groups.setdefault(group.wallet, []).append(group)
+        task = asyncio.create_task(collect(group))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return group
+
+    def close(self, group):
+        """
+        Stop collecting answers for `group`, keeping it as a tombstone.
+        """
+        groups = self.groups.get(group.wallet, [])
+        if group in groups:
+            groups.remove(group)
+        if not groups:
+            self.groups.pop(group.wallet, None)
+        now = time.monotonic()
+        group.closed_at = now
+        for wallet in list(self.closed):
+            self.closed[wallet] = [g for g in self.closed[wallet] if now - g.closed_at < self.tombstone_ttl]
+            if not self.closed[wallet]:
+                del self.closed[wallet]
+        self.closed.setdefault(group.wallet, []).append(group)
+
+    def find(self, wallet, path, original=None):
+        """
+        The innermost group `path` is a branch of, as (group, branch). Closed
+        groups are only considered for the same `original` request, and lose
+        to an open group at the same depth; check `group.closed_at`.
+        """
+        wallet = wallet.lower()
+        candidates = list(self.groups.get(wallet, []))
+        if original is not None:
+            candidates += [group for group in self.closed.get(wallet, []) if group.original == original]
+        best = None
+        for group in candidates:
+            branch = group.branch_of(path)
+            if branch is not None and (best is None or len(group.path) > len(best[0].path)):
+                best = (group, branch)
+        return best
+
+    def ordering_key(self, wallet, path):
+        """
+        Dispatcher key for a hop: branches of a fan-out get their own lane so
+        they run in parallel, everything else stays ordered per wallet.
+        """
+        found = self.find(wallet, path)
+        if found is None:
+            return wallet
+        group, branch = found
+        return f"{wallet}/{'/'.join(group.path)}/{branch}"
+
+
+def weighted_vote(responses, weights):
+    """
+    The answer with the highest total weight; ties go to the earliest.
+    """
+    totals = {}
+    first = {}
+    for branch, text in responses.items():
+        key = normalise(text)
+        totals[key] = totals.get(key, 0) + weights.get(branch, 1.0)
+        first.setdefault(key, text)
+    return first[max(totals, key=totals.get)]
+
+def synthesis_messages(original, responses, names):
+    answers = "\n\n".join(f"[{names.get(branch, branch)}]\n{text}" for branch, text in responses.items())
+    return [
+        {"role": "system", "content": "Several specialist agents answered parts of the user's request. "
+                                      "Combine their answers into one reply to the user. Resolve conflicts "
+                                      "in favour of the more specific answer and don't mention the agents."},
+        {"role": "user", "content": f"Request: {original}\n\nAnswers:\n{answers}"},
+    ]
+
+async def aggregate(group, responses, agents, complete):
+    """
+    Merge branch answers with the group's aggregator. `agents` maps branch
+    addresses to agent dicts; `complete(messages)` runs an LLM call.
+    """
+    if not responses:
+        return "Sorry, none of the agents answered in time."
+    if group.aggregator == "first" or len(responses) == 1:
+        return next(iter(responses.values()))
+    if group.aggregator == "vote":
+        weights = {branch: float(agent.get("weight", 1.0)) for branch, agent in agents.items() if agent is not None}
+        return weighted_vote(responses, weights)
+    names = {branch: agent["name"] for branch, agent in agents.items() if agent is not None and "name" in agent}
+    return await complete(synthesis_messages(group.original, responses, names))
@@ -0,0 +1,137 @@
+"""
+Fast Router
+-----------
+Local TF-IDF router that picks the next agent without an LLM round trip when
+a query clearly belongs to one agent (e.g. place searches to google_maps).
+
+A route is taken only if the best agent scores at least FAST_ROUTE_THRESHOLD,
+beats the runner-up by FAST_ROUTE_MARGIN and beats the current agent itself.
+FAST_ROUTE_MODE is "shadow" (the default: score but only log routes), "on" (take
+confident routes) or "off". Unless it is off, every decision is appended to
+FAST_ROUTE_LOG as JSON lines together with the LLM's choice whenever the LLM
+ran, so precision can be measured before turning it on;
+FAST_ROUTE_AUDIT_RATE sends a share of confident routes to the LLM anyway.
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import re
+import time
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger("fast_router")
+
+FAST_ROUTE_MODE = os.getenv("FAST_ROUTE_MODE", "shadow")
+FAST_ROUTE_THRESHOLD = float(os.getenv("FAST_ROUTE_THRESHOLD", 0.35))
+FAST_ROUTE_MARGIN = float(os.getenv("FAST_ROUTE_MARGIN", 0.1))
+FAST_ROUTE_AUDIT_RATE = float(os.getenv("FAST_ROUTE_AUDIT_RATE", 0.05))
+FAST_ROUTE_LOG = os.getenv("FAST_ROUTE_LOG", "fast_route.jsonl")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "for", "from", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "please", "the", "their", "to", "what", "where", "which", "with", "you", "your",
+}
+
+
+def tokenize(text):
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+
+class Route:
+    def __init__(self, agent_id, score, margin, confident):
+        self.agent_id = agent_id
+        self.score = score
+        self.margin = margin
+        self.confident = confident
+
+
+class FastRouter:
+    def __init__(self, registry, mode=FAST_ROUTE_MODE, threshold=FAST_ROUTE_THRESHOLD, margin=FAST_ROUTE_MARGIN):
+        self.mode = mode
+        self.threshold = threshold
+        self.margin = margin
+        # (agent ids, vocabulary, idf, normalised tf-idf matrix), swapped as one
+        self.model = ([], {}, None, None)
+        registry.on_change(self.rebuild)
+
+    def rebuild(self, agents):
+        ids = [a["id"] for a in agents]
+        docs = [tokenize(f"{a['id'].replace('_', ' ')} {a.get('name', '')} {a['description']}") for a in agents]
+        vocabulary = {}
+        for doc in docs:
+            for token in doc:
+                vocabulary.setdefault(token, len(vocabulary))
+        if not vocabulary:
+            self.model = ([], {}, None, None)
+            return
+        df = Counter(token for doc in docs for token in set(doc))
+        idf = np.zeros(len(vocabulary), dtype=np.float32)
+        for token, index in vocabulary.items():
+            idf[index] = math.log((1 + len(docs)) / (1 + df[token])) + 1
+        matrix = np.stack([self.vectorize(doc, vocabulary, idf) for doc in docs])
+        self.model = (ids, vocabulary, idf, matrix)
+
+    @staticmethod
+    def vectorize(tokens, vocabulary, idf):
+        vector = np.zeros(len(vocabulary), dtype=np.float32)
+        for token, count in Counter(tokens).items():
+            if token in vocabulary:
+                vector[vocabulary[token]] = count
+        vector *= idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def route(self, query, current_id, excluded_ids):
+        """
+        Score `query` against every agent. Returns a Route for the best agent
+        not in `excluded_ids`, or None if there is nothing to route to.
+        """
+        if self.mode == "off":
+            return None
+        ids, vocabulary, idf, matrix = self.model
+        if matrix is None:
+            return None
+        scores = matrix @ self.vectorize(tokenize(query), vocabulary, idf)
+        ranked = [i for i in np.argsort(-scores) if ids[i] not in excluded_ids]
+        if not ranked:
+            return None
+        best = float(scores[ranked[0]])
+        runner_up = float(scores[ranked[1]]) if len(ranked) > 1 else 0.0
+        own = float(scores[ids.index(current_id)]) if current_id in ids else 0.0
+        margin = best - max(runner_up, own)
+        confident = best >= self.threshold and margin >= self.margin
+        return Route(ids[ranked[0]], best, margin, confident)
+
+    def should_skip_llm(self, route):
+        if self.mode != "on" or route is None or not route.confident:
+            return False
+        # Keep auditing a sample of confident routes against the LLM
+        return random.random() >= FAST_ROUTE_AUDIT_RATE
+
+    def record(self, query, current_id, route, taken, llm_choice=None):
+        """
+        Append one routing decision to the decision log.
+        """
+        if self.mode == "off":
+            return
+        entry = {
+            "time": time.time(),
+            "agent": current_id,
+            "query": query,
+            "predicted": route.agent_id if route else None,
+            "score": route.score if route else None,
+            "margin": route.margin if route else None,
+            "confident": route.confident if route else False,
+            "taken": taken,
+            "llm_choice": llm_choice,
+        }
+        try:
+            with open(FAST_ROUTE_LOG, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write routing log: {e}")
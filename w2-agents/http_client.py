@@ -0,0 +1,110 @@
+"""
+Shared HTTP Client
+------------------
+One pooled async HTTP client for every outbound API call (OpenAI, Google Maps).
+
+Connections are kept alive and reused, each host gets at most
+HTTP_PER_HOST_LIMIT requests in flight, and 429/5xx responses or transport
+errors are retried with exponential backoff (honouring Retry-After).
+"""
+
+import asyncio
+import logging
+import os
+import random
+
+import httpx
+from openai import AsyncOpenAI
+
+logger = logging.getLogger("http_client")
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", 16))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", 0.5))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """
+    Pooled transport with per-host concurrency limits and retries.
+    """
+    def __init__(self, per_host_limit=PER_HOST_LIMIT, max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+        self.transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+            http2=False,
+        )
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.host_limits = {}
+
+    def host_limit(self, host):
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self.host_limits[host]
+
+    def retry_delay(self, attempt, response=None):
+        if response is not None and "retry-after" in response.headers:
+            try:
+                return float(response.headers["retry-after"])
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    async def handle_async_request(self, request):
+        # The semaphore covers sending the request and receiving headers;
+        # streamed bodies are read after it is released.
+        async with self.host_limit(request.url.host):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self.transport.handle_async_request(request)
+                except httpx.TransportError as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.retry_delay(attempt)
+                    logger.warning(f"{request.method} {request.url.host} failed ({e}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay = self.retry_delay(attempt, response)
+                logger.warning(f"{request.method} {request.url.host} returned {response.status_code}, retrying in {delay:.1f}s")
+                await response.aclose()
+                await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+client = None
+openai_client = None
+
+def get_client():
+    global client
+    if client is None:
+        client = httpx.AsyncClient(
+            transport=RetryTransport(),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+    return client
+
+def get_openai():
+    """
+    AsyncOpenAI bound to the shared pool. The SDK's own retries are disabled
+    because the transport already retries.
+    """
+    global openai_client
+    if openai_client is None:
+        openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=get_client(), max_retries=0)
+    return openai_client
+
+async def aclose():
+    global client, openai_client
+    if client is not None:
+        await client.aclose()
+    client = None
+    openai_client = None
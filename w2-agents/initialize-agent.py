@@ -4,6 +4,7 @@ Agent Initializer
 ----------------
 This script automatically initializes a set of predefined agents on startup.
 It can be run as part of a deployment process or system initialization.
+Pass --bulk to create all missing agents in parallel instead of one by one.
 """
 
 import random
@@ -12,8 +13,11 @@ from scipy import stats
 load_dotenv()
 
 import os
+import sys
+import rlp
 import db
-import time
+import chain
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from web3 import Web3
 from rich.console import Console
@@ -372,17 +376,7 @@ def generate_random_sparkline_data() -> list:
 # Send transaction and wait for confirmation
 def send_transaction(w3, contract_function, wallet_address, private_key):
     try:
-        nonce = w3.eth.get_transaction_count(wallet_address)
-        tx = contract_function.build_transaction({
-            'from': wallet_address,
-            'gas': 2000000,
-            'gasPrice': w3.eth.gas_price,
-            'nonce': nonce,
-            'chainId': w3.eth.chain_id
-        })
-        
-        signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = chain.send_transaction(w3, contract_function, wallet_address, private_key)
         logger.info(f"Transaction sent: {tx_hash.hex()}")
         
         logger.info("Waiting for transaction confirmation...")
@@ -398,23 +392,83 @@ def send_transaction(w3, contract_function, wallet_address, private_key):
         logger.exception(f"Error sending transaction: {e}")
         return None
 
-# Check if agent already exists
-def agent_exists(agent_factory, wallet_address, agent_name):
+# Multicall3 is deployed at the same address on Sepolia and most EVM chains
+MULTICALL3_ADDR = os.getenv('MULTICALL3_ADDR', '0xcA11bde05977b3631167028862bE2a173976CA11')
+multicall3_abi = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]"
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    }
+]
+AGENT_DETAILS_TYPES = ["string", "string", "address", "uint256", "bool"]
+
+# Resolve getAgentDetails for many agents in a single eth_call
+def multicall_agent_details(w3, agent_factory, addresses):
+    multicall = w3.eth.contract(address=MULTICALL3_ADDR, abi=multicall3_abi)
+    calls = [(agent_factory.address, True, agent_factory.encode_abi("getAgentDetails", args=[address]))
+             for address in addresses]
+    results = multicall.functions.aggregate3(calls).call()
+    return [w3.codec.decode(AGENT_DETAILS_TYPES, data) if success else None for success, data in results]
+
+# Same as above through a JSON-RPC batch, for chains without Multicall3
+def batch_agent_details(w3, agent_factory, addresses):
+    with w3.batch_requests() as batch:
+        for address in addresses:
+            batch.add(agent_factory.functions.getAgentDetails(address))
+        return batch.execute()
+
+# Map agent name -> address for every agent owned by the wallet
+def discover_agents(w3, agent_factory, wallet_address, known=None, strict=False):
+    """
+    One getAgentsByOwner call plus one batched details request. Addresses
+    already in `known` (a name -> address map) are not looked up again.
+    Errors are logged and give what was found so far, unless `strict`.
+    """
+    agents = dict(known or {})
+    known_addresses = set(agents.values())
     try:
-        # Get all agents for this wallet
-        agent_addresses = agent_factory.functions.getAgentsByOwner(wallet_address).call()
-        
-        # Check each agent's name
-        for address in agent_addresses:
-            details = agent_factory.functions.getAgentDetails(address).call()
-            name = details[0]
-            if name == agent_name:
-                return True, address
-        
-        return False, None
+        owned = agent_factory.functions.getAgentsByOwner(wallet_address).call()
+        addresses = [address for address in owned if address not in known_addresses]
+        if not addresses:
+            return agents
+        try:
+            details = multicall_agent_details(w3, agent_factory, addresses)
+        except Exception as e:
+            logger.warning(f"Multicall unavailable ({e}), falling back to a JSON-RPC batch")
+            details = batch_agent_details(w3, agent_factory, addresses)
+        for address, detail in zip(addresses, details):
+            # Keep the first agent with a given name, like the old linear scan
+            if detail:
+                agents.setdefault(detail[0], address)
     except Exception as e:
-        logger.exception(f"Error checking if agent exists: {e}")
-        return False, None
+        if strict:
+            raise
+        logger.exception(f"Error discovering agents: {e}")
+    return agents
 
 # Main initialization function
 def initialize_agents():
@@ -426,6 +480,10 @@ def initialize_agents():
         wallet_address, private_key = get_wallet_credentials()
         logger.info(f"Using wallet: {wallet_address}")
         
+        # Look up every existing agent once up front
+        known_agents = discover_agents(w3, agent_factory, wallet_address)
+        logger.info(f"Found {len(known_agents)} existing agents")
+        
         # Initialize each agent if it doesn't already exist
         for agent_config in INITIAL_AGENTS:
             name = agent_config["name"]
@@ -434,8 +492,8 @@ def initialize_agents():
             sparkline_data = generate_random_sparkline_data()
             
             # Check if agent already exists
-            exists, address = agent_exists(agent_factory, wallet_address, name)
-            if exists:
+            address = known_agents.get(name)
+            if address:
                 db.add_agent(agent_config["id"], {
                     "name": name,
                     "description": description,
@@ -465,8 +523,10 @@ def initialize_agents():
             
             if tx_receipt:
                 print(tx_receipt)
-                exists, address = agent_exists(agent_factory, wallet_address, name)
-                if exists:
+                # Only the newly created address needs resolving
+                known_agents = discover_agents(w3, agent_factory, wallet_address, known_agents)
+                address = known_agents.get(name)
+                if address:
                     db.add_agent(agent_config["id"], {
                         "name": name,
                     "description": description,
@@ -488,9 +548,6 @@ def initialize_agents():
                     logger.warning(f"Agent '{name}' created but couldn't extract address from logs")
             else:
                 logger.error(f"Failed to create agent: {name}")
-            
-            # Add a small delay between transactions to avoid nonce issues
-            time.sleep(2)
         
         logger.info("Agent initialization completed")
         
@@ -500,9 +557,121 @@ def initialize_agents():
     
     return True
 
+# Firestore document for an agent, with randomised dashboard metrics
+def agent_document(agent_config, address):
+    return {
+        "name": agent_config["name"],
+        "description": agent_config["description"],
+        "address": address,
+        "sparklineColor": "#C084FC",
+        "sparklineData": generate_random_sparkline_data(),
+        "speed": random.randint(50, 100),
+        "accuracy": random.randint(50, 100),
+        "reliability": random.randint(50, 100),
+        "efficiency": random.randint(50, 100),
+        "learning": random.randint(50, 100),
+        "relations": random.randint(0, 10),
+        "uptime": random.randint(90, 100),
+        "response": random.randint(50, 200),
+        "latency": random.randint(50, 200)
+    }
+
+# Address of the contract a factory creates at a given factory nonce (CREATE)
+def create_address(factory_address, nonce):
+    encoded = rlp.encode([bytes.fromhex(factory_address[2:]), nonce])
+    return Web3.to_checksum_address(Web3.keccak(encoded)[12:])
+
+# Bulk provisioning: create all missing agents in roughly one block
+def provision_agents_bulk():
+    """
+    Diff INITIAL_AGENTS against the chain, send every missing createAgent
+    back-to-back with locally assigned nonces, wait for the receipts in
+    parallel and write all Firestore documents in one batch.
+
+    createAgent's return value isn't in the receipt, so new addresses are
+    predicted from the factory's CREATE nonce and then confirmed with one
+    batched details call; anything that doesn't match (another sender created
+    agents in between) falls back to discovery.
+    """
+    try:
+        console.print("[bold blue]===== Agent Initializer (bulk) =====\n[/bold blue]")
+        
+        w3, agent_factory = setup_web3_and_contracts()
+        wallet_address, private_key = get_wallet_credentials()
+        logger.info(f"Using wallet: {wallet_address}")
+        
+        # A failed lookup must not look like "no agents yet" here, or every
+        # agent would be created again
+        known_agents = discover_agents(w3, agent_factory, wallet_address, strict=True)
+        missing = [a for a in INITIAL_AGENTS if a["name"] not in known_agents]
+        logger.info(f"{len(INITIAL_AGENTS) - len(missing)} agents exist, {len(missing)} to create")
+        
+        if missing:
+            factory_nonce = w3.eth.get_transaction_count(agent_factory.address, "pending")
+            tx_hashes = []
+            for agent_config in missing:
+                tx_hash = chain.send_transaction(
+                    w3,
+                    agent_factory.functions.createAgent(agent_config["name"], agent_config["description"]),
+                    wallet_address,
+                    private_key
+                )
+                logger.info(f"Creating agent '{agent_config['name']}': {tx_hash.hex()}")
+                tx_hashes.append(tx_hash)
+            
+            with ThreadPoolExecutor(max_workers=len(tx_hashes)) as pool:
+                receipts = list(pool.map(w3.eth.wait_for_transaction_receipt, tx_hashes))
+            
+            created = [(a, r) for a, r in zip(missing, receipts) if r["status"] == 1]
+            for agent_config, receipt in zip(missing, receipts):
+                if receipt["status"] != 1:
+                    logger.error(f"Failed to create agent: {agent_config['name']}")
+            
+            # Our transactions mine in nonce order, so the i-th successful
+            # create normally used factory nonce + i.
+            predicted = [create_address(agent_factory.address, factory_nonce + i) for i in range(len(created))]
+            details = multicall_agent_details(w3, agent_factory, predicted) if predicted else []
+            unresolved = False
+            for (agent_config, _), address, detail in zip(created, predicted, details):
+                if detail and detail[0] == agent_config["name"] and detail[2].lower() == wallet_address.lower():
+                    known_agents[agent_config["name"]] = address
+                else:
+                    unresolved = True
+            if unresolved:
+                logger.warning("Predicted agent addresses didn't all match, discovering the rest")
+                known_agents = discover_agents(w3, agent_factory, wallet_address, known_agents, strict=True)
+        
+        # New documents get fresh metrics; existing ones keep theirs and only
+        # have their on-chain fields corrected
+        stored = {agent["id"]: agent for agent in db.list_agent()}
+        documents = {}
+        for agent_config in INITIAL_AGENTS:
+            address = known_agents.get(agent_config["name"])
+            current = stored.get(agent_config["id"])
+            if not address:
+                logger.warning(f"No address for agent '{agent_config['name']}', skipping")
+            elif current is None:
+                documents[agent_config["id"]] = agent_document(agent_config, address)
+            elif (current.get("name"), current.get("description"), current.get("address")) != \
+                    (agent_config["name"], agent_config["description"], address):
+                documents[agent_config["id"]] = {
+                    **{k: v for k, v in current.items() if k != "id"},
+                    "name": agent_config["name"],
+                    "description": agent_config["description"],
+                    "address": address,
+                }
+        db.add_agents(documents)
+        logger.info(f"Wrote {len(documents)} agents to the database")
+        
+    except Exception as e:
+        logger.exception(f"Error during bulk agent provisioning: {e}")
+        return False
+    
+    return True
+
 # Run the initialization if this script is executed directly
 if __name__ == "__main__":
-    success = initialize_agents()
+    success = provision_agents_bulk() if "--bulk" in sys.argv else initialize_agents()
     if success:
         console.print("[bold green]Agent initialization successful.[/bold green]")
     else:
@@ -0,0 +1,320 @@
+"""
+Oracle Journal
+--------------
+Durable oracle state in a local SQLite file (ORACLE_JOURNAL_PATH), so a
+restart resumes where the previous process stopped:
+
+- the last fully processed block,
+- every IRIS log handled, keyed by (blockHash, txHash, logIndex), with its
+  decoded arguments and whether its hop finished, so unfinished hops are
+  re-run and finished ones are never run twice. Hops are at-least-once: one
+  interrupted mid-way runs again from the start after a restart,
+- the hashes of recent blocks, to detect reorgs,
+- each user request with the hops it went through and its final result.
+  Hop events carry no request id, so a hop belongs to the oldest pending
+  request of its wallet whose input is the hop's original query.
+
+Finished logs and requests are kept for JOURNAL_RETENTION_DAYS and pruned
+by `prune()` when the oracle starts.
+
+Writes are small single-row statements in WAL mode, cheap enough to make
+straight from the event loop.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("journal")
+
+ORACLE_JOURNAL_PATH = os.getenv("ORACLE_JOURNAL_PATH", "oracle_journal.db")
+JOURNAL_RETENTION_DAYS = float(os.getenv("JOURNAL_RETENTION_DAYS", 7))
+
+
+class Journal:
+    def __init__(self, path=ORACLE_JOURNAL_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(logs)")]
+            if columns and "block_hash" not in columns:
+                # Journals from before reorg handling keyed logs by (txHash, logIndex)
+                self.connection.execute("DROP INDEX IF EXISTS logs_status")
+                self.connection.execute("ALTER TABLE logs RENAME TO logs_v1")
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS logs (
+                    block_hash TEXT NOT NULL,
+                    tx_hash TEXT NOT NULL,
+                    log_index INTEGER NOT NULL,
+                    block_number INTEGER,
+                    contract TEXT,
+                    args TEXT,
+                    status TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (block_hash, tx_hash, log_index)
+                );
+                CREATE INDEX IF NOT EXISTS logs_status ON logs (status);
+                CREATE INDEX IF NOT EXISTS logs_tx ON logs (tx_hash);
+                CREATE TABLE IF NOT EXISTS blocks (number INTEGER PRIMARY KEY, hash TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS requests (
+                    request_id TEXT PRIMARY KEY,
+                    wallet TEXT NOT NULL,
+                    input TEXT,
+                    status TEXT NOT NULL,
+                    hops TEXT NOT NULL,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS requests_wallet ON requests (wallet, status, created_at);
+            """)
+            if columns and "block_hash" not in columns:
+                self.connection.executescript("""
+                    INSERT INTO logs (block_hash, tx_hash, log_index, block_number, contract, args, status, updated_at)
+                    SELECT '', tx_hash, log_index, block_number, contract, args,
+                           CASE status WHEN 'pending' THEN 'queued' ELSE status END, updated_at FROM logs_v1;
+                    DROP TABLE logs_v1;
+                """)
+        return self.connection
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            return self.connect().execute(sql, params).rowcount
+
+    def fetchone(self, sql, params=()):
+        with self.lock:
+            return self.connect().execute(sql, params).fetchone()
+
+    def fetchall(self, sql, params=()):
+        with self.lock:
+            return self.connect().execute(sql, params).fetchall()
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    # Block checkpoint
+
+    def get_checkpoint(self, name="last_block"):
+        row = self.fetchone("SELECT value FROM checkpoints WHERE name = ?", (name,))
+        return row[0] if row else None
+
+    def set_checkpoint(self, block, name="last_block", rewind=False):
+        """
+        Store the checkpoint; it only moves backwards when `rewind` is set.
+        """
+        if rewind:
+            self.execute(
+                "INSERT INTO checkpoints (name, value) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                (name, block),
+            )
+        else:
+            self.execute(
+                "INSERT INTO checkpoints (name, value) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)",
+                (name, block),
+            )
+
+    # Recent block hashes, for reorg detection
+
+    def set_block_hash(self, number, hash, window):
+        self.execute("INSERT OR REPLACE INTO blocks (number, hash) VALUES (?, ?)", (number, hash))
+        self.execute("DELETE FROM blocks WHERE number <= ?", (number - window,))
+
+    def recent_blocks(self):
+        """
+        Recorded (number, hash) pairs, newest first.
+        """
+        return self.fetchall("SELECT number, hash FROM blocks ORDER BY number DESC")
+
+    def rewind(self, number):
+        """
+        Forget blocks after `number` and orphan their logs whose hop hasn't
+        started. Returns how many queued hops were orphaned.
+        """
+        self.execute("DELETE FROM blocks WHERE number > ?", (number,))
+        orphaned = self.execute(
+            "UPDATE logs SET status = 'orphaned', updated_at = ? WHERE block_number > ? AND status = 'queued'",
+            (time.time(), number),
+        )
+        self.set_checkpoint(number, rewind=True)
+        return orphaned
+
+    # Processed logs
+
+    def claim_log(self, block_hash, tx_hash, log_index, block_number, contract, args):
+        """
+        Record a log as queued. Returns False if this exact log was seen
+        before, or if the same transaction already fired a hop from a block
+        that has since been reorged out.
+        """
+        fired = self.fetchone(
+            # Log indexes shift when a transaction lands in a different block
+            "SELECT 1 FROM logs WHERE tx_hash = ? AND args = ? AND status IN ('running', 'done', 'failed')",
+            (tx_hash, json.dumps(args)),
+        )
+        if fired is not None:
+            return False
+        inserted = self.execute(
+            "INSERT INTO logs (block_hash, tx_hash, log_index, block_number, contract, args, status, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?) "
+            # A rewind may orphan logs whose block turns out to be canonical
+            "ON CONFLICT (block_hash, tx_hash, log_index) DO UPDATE SET status = 'queued', updated_at = excluded.updated_at "
+            "WHERE status = 'orphaned'",
+            (block_hash, tx_hash, log_index, block_number, contract, json.dumps(args), time.time()),
+        )
+        return inserted == 1
+
+    def start_log(self, block_hash, tx_hash, log_index):
+        """
+        Mark a queued log as running. Returns False if it was orphaned.
+        """
+        return self.execute(
+            "UPDATE logs SET status = 'running', updated_at = ? "
+            "WHERE block_hash = ? AND tx_hash = ? AND log_index = ? AND status IN ('queued', 'running')",
+            (time.time(), block_hash, tx_hash, log_index),
+        ) == 1
+
+    def orphan_log(self, block_hash, tx_hash, log_index):
+        """
+        Orphan a log the node reported as removed. Returns its previous status.
+        """
+        row = self.fetchone(
+            "SELECT status FROM logs WHERE block_hash = ? AND tx_hash = ? AND log_index = ?",
+            (block_hash, tx_hash, log_index),
+        )
+        self.execute(
+            "UPDATE logs SET status = 'orphaned', updated_at = ? "
+            "WHERE block_hash = ? AND tx_hash = ? AND log_index = ? AND status = 'queued'",
+            (time.time(), block_hash, tx_hash, log_index),
+        )
+        return row[0] if row else None
+
+    def finish_log(self, block_hash, tx_hash, log_index, status="done"):
+        self.execute(
+            "UPDATE logs SET status = ?, updated_at = ? WHERE block_hash = ? AND tx_hash = ? AND log_index = ?",
+            (status, time.time(), block_hash, tx_hash, log_index),
+        )
+
+    def pending_logs(self):
+        """
+        Logs claimed by a previous process whose hop never finished, oldest first.
+        """
+        rows = self.fetchall(
+            "SELECT block_hash, tx_hash, log_index, contract, args FROM logs WHERE status IN ('queued', 'running') "
+            "ORDER BY block_number, log_index"
+        )
+        return [(block_hash, tx_hash, log_index, contract, json.loads(args))
+                for block_hash, tx_hash, log_index, contract, args in rows]
+
+    # Requests
+
+    def open_request(self, wallet, input, request_id=None):
+        request_id = request_id or uuid.uuid4().hex
+        now = time.time()
+        self.execute(
+            "INSERT OR IGNORE INTO requests (request_id, wallet, input, status, hops, result, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'pending', '[]', NULL, ?, ?)",
+            (request_id, wallet.lower(), input, now, now),
+        )
+        return request_id
+
+    def current_request(self, wallet, original=None):
+        """
+        Oldest unanswered request of `wallet`, or with `original` the oldest
+        one that asked exactly that.
+        """
+        if original is None:
+            row = self.fetchone(
+                "SELECT request_id FROM requests WHERE wallet = ? AND status = 'pending' ORDER BY created_at LIMIT 1",
+                (wallet.lower(),),
+            )
+        else:
+            row = self.fetchone(
+                "SELECT request_id FROM requests WHERE wallet = ? AND input = ? AND status = 'pending' "
+                "ORDER BY created_at LIMIT 1",
+                (wallet.lower(), original),
+            )
+        return row[0] if row else None
+
+    def record_hop(self, request_id, agent_id):
+        row = self.fetchone("SELECT hops FROM requests WHERE request_id = ?", (request_id,))
+        if row is None:
+            return
+        self.execute(
+            "UPDATE requests SET hops = ?, updated_at = ? WHERE request_id = ?",
+            (json.dumps(json.loads(row[0]) + [agent_id]), time.time(), request_id),
+        )
+
+    def complete_request(self, request_id, result):
+        """
+        Store the answer of a pending request. Returns False if it wasn't
+        pending any more (answered, or failed).
+        """
+        return self.execute(
+            "UPDATE requests SET status = 'answered', result = ?, updated_at = ? "
+            "WHERE request_id = ? AND status = 'pending'",
+            (result, time.time(), request_id),
+        ) == 1
+
+    def fail_request(self, request_id, result):
+        """
+        Give up on a pending request with `result` as its answer. Returns
+        False if it wasn't pending any more.
+        """
+        return self.execute(
+            "UPDATE requests SET status = 'failed', result = ?, updated_at = ? "
+            "WHERE request_id = ? AND status = 'pending'",
+            (result, time.time(), request_id),
+        ) == 1
+
+    def get_request(self, request_id):
+        row = self.fetchone(
+            "SELECT request_id, wallet, input, status, hops, result, created_at FROM requests WHERE request_id = ?",
+            (request_id,),
+        )
+        if row is None:
+            return None
+        return {
+            "request_id": row[0],
+            "wallet": row[1],
+            "input": row[2],
+            "status": row[3],
+            "hops": json.loads(row[4]),
+            "result": row[5],
+            "created_at": row[6],
+        }
+
+    # Retention
+
+    def prune(self, retention_days=JOURNAL_RETENTION_DAYS):
+        """
+        Delete finished logs and requests last updated more than
+        `retention_days` ago. Logs are only deleted below the checkpoint, so
+        no rescan can meet them again. Returns (logs, requests) deleted.
+        """
+        cutoff = time.time() - retention_days * 86400
+        checkpoint = self.get_checkpoint() or 0
+        logs = self.execute(
+            "DELETE FROM logs WHERE status IN ('done', 'failed', 'orphaned') AND updated_at < ? AND block_number < ?",
+            (cutoff, checkpoint),
+        )
+        requests = self.execute(
+            "DELETE FROM requests WHERE status IN ('answered', 'failed') AND updated_at < ?",
+            (cutoff,),
+        )
+        return logs, requests
@@ -0,0 +1,128 @@
+"""
+Metrics and Tracing
+-------------------
+Per-stage timings for the request pipeline, exported two ways:
+
+- Prometheus, served on the app's /metrics: an `iris_stage_seconds`
+  histogram and an `iris_stage_failures_total` counter labelled by stage,
+  `iris_rpc_calls_total` by JSON-RPC method, and the response cache's
+  lookups by result.
+- OpenTelemetry spans (`iris.<stage>`), one per request and hop with the
+  stages inside them as children, when `opentelemetry-api` is installed.
+  Without a configured SDK the spans are no-ops.
+
+Stages: request, dispatch_wait, hop, get_logs, registry_refresh, llm,
+llm_first_token, places, send_transaction, receipt.
+"""
+
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+
+from web3.middleware import Web3Middleware
+
+try:
+    import prometheus_client
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace
+    tracer = trace.get_tracer("iris")
+except ImportError:
+    tracer = None
+
+logger = logging.getLogger("metrics")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+if prometheus_client is not None:
+    STAGE_SECONDS = prometheus_client.Histogram(
+        "iris_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets=BUCKETS)
+    STAGE_FAILURES = prometheus_client.Counter(
+        "iris_stage_failures_total", "Pipeline stages that raised", ["stage"])
+    RPC_CALLS = prometheus_client.Counter(
+        "iris_rpc_calls_total", "JSON-RPC calls made to the node", ["method"])
+
+
+def observe(name, seconds):
+    if prometheus_client is not None:
+        STAGE_SECONDS.labels(name).observe(seconds)
+
+@contextmanager
+def stage(name, **attributes):
+    """
+    Time the enclosed block as stage `name` and trace it as a span.
+    Works around `await`s too.
+    """
+    span = nullcontext()
+    if tracer is not None:
+        span = tracer.start_as_current_span(
+            f"iris.{name}", attributes={k: str(v) for k, v in attributes.items() if v is not None})
+    started = time.perf_counter()
+    with span:
+        try:
+            yield
+        except Exception:
+            if prometheus_client is not None:
+                STAGE_FAILURES.labels(name).inc()
+            raise
+        finally:
+            observe(name, time.perf_counter() - started)
+
+
+class RPCMetrics(Web3Middleware):
+    """
+    Web3 middleware counting JSON-RPC calls by method.
+    """
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            if prometheus_client is not None:
+                RPC_CALLS.labels(method).inc()
+            return make_request(method, params)
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            if prometheus_client is not None:
+                RPC_CALLS.labels(method).inc()
+            return await make_request(method, params)
+        return middleware
+
+
+class CacheCollector:
+    """
+    Exposes a ResponseCache's counters at scrape time.
+    """
+    def __init__(self, name, cache):
+        self.name = name
+        self.cache = cache
+
+    def collect(self):
+        stats = self.cache.stats()
+        lookups = CounterMetricFamily(f"iris_{self.name}_lookups", f"{self.name} lookups by result", labels=["result"])
+        lookups.add_metric(["exact"], stats["hits_exact"])
+        lookups.add_metric(["semantic"], stats["hits_semantic"])
+        lookups.add_metric(["miss"], stats["misses"])
+        yield lookups
+        yield GaugeMetricFamily(f"iris_{self.name}_entries", f"Entries in the {self.name}", value=stats["entries"])
+
+# Names of the caches already exported
+watched_caches = set()
+
+def watch_cache(name, cache):
+    """
+    Export a cache's counters; watching the same name again is a no-op.
+    """
+    if prometheus_client is not None and name not in watched_caches:
+        prometheus_client.REGISTRY.register(CacheCollector(name, cache))
+        watched_caches.add(name)
+
+def render():
+    """
+    The Prometheus exposition as (body, content type).
+    """
+    if prometheus_client is None:
+        return b"prometheus_client is not installed\n", "text/plain"
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Agent Migrator
+--------------
+Copies the agent registry between storage backends, or to and from a JSON
+export file.
+
+    python migrate-agents.py firestore sqlite
+    python migrate-agents.py postgres json:agents.json
+    python migrate-agents.py json:agents.json sqlite
+
+Backends are configured by the same environment variables as the app
+(IRIS_SQLITE_PATH, IRIS_POSTGRES_DSN, Firestore credentials).
+"""
+
+import argparse
+import json
+import logging
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from rich.console import Console
+from rich.logging import RichHandler
+
+import db
+import storage
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(message)s",
+    handlers=[RichHandler(rich_tracebacks=True)]
+)
+logger = logging.getLogger("agent_migrator")
+console = Console()
+
+
+def read_agents(source):
+    if source.startswith("json:"):
+        with open(source[len("json:"):]) as f:
+            return json.load(f)
+    return storage.create_store(source, db.get_db).list_agent()
+
+def write_agents(destination, agents):
+    if destination.startswith("json:"):
+        with open(destination[len("json:"):], "w") as f:
+            json.dump(agents, f, indent=2, default=str)
+        return
+    store = storage.create_store(destination, db.get_db)
+    store.add_agents({agent["id"]: {k: v for k, v in agent.items() if k != "id"} for agent in agents})
+
+def migrate(source, destination):
+    agents = read_agents(source)
+    logger.info(f"Read {len(agents)} agents from {source}")
+    write_agents(destination, agents)
+    logger.info(f"Wrote {len(agents)} agents to {destination}")
+    return len(agents)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy agents between storage backends.")
+    parser.add_argument("source", help="firestore, sqlite, postgres or json:<path>")
+    parser.add_argument("destination", help="firestore, sqlite, postgres or json:<path>")
+    args = parser.parse_args()
+    try:
+        migrate(args.source, args.destination)
+        console.print("[bold green]Agent migration successful.[/bold green]")
+    except Exception as e:
+        logger.exception(f"Agent migration failed: {e}")
+        console.print("[bold red]Agent migration failed. Check logs for details.[/bold red]")
@@ -0,0 +1,175 @@
+"""
+Off-chain Hop Lane
+------------------
+With OFFCHAIN_HOPS=1, agent-to-agent hops skip `Agent.requestData` and are
+handed straight to the oracle's dispatcher. Each hop is still recorded: the
+record goes to the HOP_LEDGER_PATH audit log right away, and every
+HOP_SETTLE_INTERVAL seconds (or HOP_SETTLE_BATCH records) the Merkle root of
+the pending records is committed to the HopLedger contract at
+HOP_LEDGER_ADDR in a single transaction. A "batch" entry is logged once that
+transaction is mined.
+
+Unsettled records are only held in memory, so on start the ledger reloads
+every "hop" entry of the audit log that no "batch" entry covers yet.
+
+Record hashes are keccak256 of the canonical JSON record; the tree hashes
+sorted pairs, so proofs verify like OpenZeppelin's MerkleProof.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+from web3 import Web3
+
+import agent
+import chain
+
+logger = logging.getLogger("offchain")
+
+OFFCHAIN_HOPS = os.getenv("OFFCHAIN_HOPS", "0") == "1"
+HOP_LEDGER_ADDR = os.getenv("HOP_LEDGER_ADDR")
+HOP_LEDGER_PATH = os.getenv("HOP_LEDGER_PATH", "hop_ledger.jsonl")
+HOP_SETTLE_INTERVAL = float(os.getenv("HOP_SETTLE_INTERVAL", 60))
+HOP_SETTLE_BATCH = int(os.getenv("HOP_SETTLE_BATCH", 256))
+
+hop_ledger_abi = [
+    {
+        "inputs": [
+            {"internalType": "bytes32", "name": "root", "type": "bytes32"},
+            {"internalType": "uint256", "name": "count", "type": "uint256"}
+        ],
+        "name": "commitBatch",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function"
+    }
+]
+
+
+def record_hash(record):
+    return Web3.keccak(text=json.dumps(record, sort_keys=True, separators=(",", ":")))
+
+def merkle_root(leaves):
+    if not leaves:
+        return b"\x00" * 32
+    level = list(leaves)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [Web3.keccak(b"".join(sorted(level[i:i + 2]))) for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def unsettled_leaves(path):
+    """
+    Hashes of the "hop" entries in the audit log at `path` that no "batch"
+    entry has settled, oldest first.
+    """
+    hops, settled = [], set()
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A write cut short by a crash
+                    logger.warning(f"Skipping malformed line in {path}")
+                    continue
+                if entry.get("type") == "hop":
+                    hops.append(entry["hash"])
+                elif entry.get("type") == "batch":
+                    settled.update(entry["leaves"])
+    except FileNotFoundError:
+        return []
+    return [Web3.to_bytes(hexstr=leaf) for leaf in hops if leaf not in settled]
+
+
+class HopLedger:
+    def __init__(self, w3, path=HOP_LEDGER_PATH, interval=HOP_SETTLE_INTERVAL, batch_size=HOP_SETTLE_BATCH,
+                 address=HOP_LEDGER_ADDR):
+        if not address:
+            raise ValueError("OFFCHAIN_HOPS=1 needs HOP_LEDGER_ADDR set to the HopLedger contract")
+        self.w3 = w3
+        self.path = path
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pending = unsettled_leaves(path)
+        if self.pending:
+            logger.info(f"Reloaded {len(self.pending)} unsettled hops from {path}")
+        self.full = asyncio.Event()
+        if len(self.pending) >= self.batch_size:
+            self.full.set()
+        self.contract = w3.eth.contract(address=address, abi=hop_ledger_abi)
+
+    def append_log(self, entry):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def record(self, wallet, sender, receiver, input, original, hops):
+        """
+        Record one off-chain hop. Returns its hash as hex.
+        """
+        record = {
+            "wallet": wallet,
+            "from": sender,
+            "to": receiver,
+            "input": input,
+            "original": original,
+            "hops": list(hops),
+            "time": time.time(),
+        }
+        leaf = record_hash(record)
+        self.pending.append(leaf)
+        self.append_log({"type": "hop", "hash": leaf.hex(), "record": record})
+        if len(self.pending) >= self.batch_size:
+            self.full.set()
+        return leaf.hex()
+
+    async def settle(self):
+        """
+        Commit the Merkle root of all pending records in one transaction.
+        The batch is only written to the audit log once the transaction is
+        mined; if it fails, its records are retried next round. Returns the
+        tx hash, or None.
+        """
+        if not self.pending:
+            return None
+        leaves, self.pending = self.pending, []
+        self.full.clear()
+        root = merkle_root(leaves)
+        try:
+            tx_hash = await asyncio.to_thread(
+                chain.send_transaction, self.w3, self.contract.functions.commitBatch(root, len(leaves)),
+                os.getenv("WALLET_ADDR"), os.getenv("WALLET_PKEY"))
+            await agent.get_receipt_watcher(self.w3).track(tx_hash)
+        except asyncio.CancelledError:
+            # Shutting down; the final settle picks these up
+            self.requeue(leaves)
+            raise
+        except Exception as e:
+            logger.error(f"Failed to settle {len(leaves)} hops, retrying next round: {e}")
+            self.requeue(leaves)
+            return None
+        logger.info(f"Settled {len(leaves)} hops with root {root.hex()} in {tx_hash.hex()}")
+        self.append_log({"type": "batch", "root": root.hex(), "count": len(leaves),
+                         "leaves": [leaf.hex() for leaf in leaves], "tx": tx_hash.hex()})
+        return tx_hash
+
+    def requeue(self, leaves):
+        self.pending = leaves + self.pending
+        if len(self.pending) >= self.batch_size:
+            self.full.set()
+
+    async def run(self):
+        """
+        Settle on every interval, or sooner when a batch fills up.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self.full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.settle()
@@ -2,21 +2,30 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-import time
+import asyncio
 import random
-import db
+import time
 from rich.console import Console
-from rich.traceback import install
-from rich.logging import RichHandler
 import logging
 from web3 import Web3
 
-from openai import OpenAI
 import websocket
-import requests  # Added for Google Maps API requests
+import http_client
 import json
 
 import agent
+import offchain
+import fanout
+import budget
+import metrics
+from context import get_w3
+from journal import Journal
+from dispatcher import Dispatcher
+from registry import AgentRegistry
+from response_cache import ResponseCache
+from tools import ToolCatalog
+from agent_index import AgentIndex
+from fast_router import FastRouter
 
 
 agent_abi = [
@@ -92,28 +101,192 @@ agent_abi = [
 	}
 ]
 
-# Setup rich and logging
-install()
 console = Console()
-logging.basicConfig(level=logging.INFO, format="%(message)s", handlers=[RichHandler()])
 logger = logging.getLogger("oracle")
 
-try:
-    w3 = Web3(Web3.HTTPProvider(f"https://eth-sepolia.g.alchemy.com/v2/{os.getenv('ALCHEMY_API_KEY')}"))
-    logger.info("Connected to Web3 provider.")
-except Exception as e:
-    console.print(f"[bold red]Failed to connect to Web3 provider: {e}[/]")
-    raise
+# Agents are looked up in memory; the registry keeps itself in sync with Firestore
+registry = AgentRegistry()
+tool_catalog = ToolCatalog(registry)
+agent_index = AgentIndex(registry)
+fast_router = FastRouter(registry)
+
+# Durable checkpoint, processed logs and request state
+journal = Journal()
+
+# Recent agent decisions and Places answers, keyed by (agent id, data, originalData)
+response_cache = ResponseCache()
+
+# Open fan-outs, whose branches answer to them instead of to the user
+fanouts = fanout.FanOutTracker()
+
+# Token and time spent per request
+budgets = budget.BudgetTracker()
+
+# Added to the system prompt when a request's budget is exhausted
+DIRECT_ANSWER_PROMPT = "\nYou can't hand this request to another agent. Answer the user directly with what you know."
+
+# Answer for a request one of whose hops failed
+FAILED_REQUEST_MESSAGE = "Sorry, something went wrong while handling your request."
+
+# Off-chain hop lane; None keeps every hop on-chain
+# (created by `start`)
+hop_ledger = None
+
+async def forward_hop(me, wallet, input, original, hops, next_address, max_hops):
+    """
+    Pass a request on to the next agent, on-chain through Agent.requestData
+    or, with the off-chain lane enabled, straight to the dispatcher.
+    `max_hops` is the hop budget the next agent receives.
+    """
+    if hop_ledger is not None:
+        record = hop_ledger.record(wallet, me, next_address, input, original, hops)
+        args = [wallet, input, original, list(hops), max_hops]
+        key = ("offchain", f"offchain:{record}", 0)
+        if journal.claim_log(*key, None, next_address, args):
+            submit_hop(key, next_address, *args)
+    else:
+        # A hand-off that reverts or is never mined ends the chain, so give
+        # up on the request (or just this branch of a fan-out)
+        def on_failure(error):
+            fail_request(wallet, original, list(hops) + [next_address])
+        submitted = await agent.submit_contract_function(get_w3(), wallet, input, original, hops, logger,
+                                                         next_address, max_hops=max_hops, on_failure=on_failure)
+        if submitted is None:
+            raise RuntimeError(f"Could not forward the request to {next_address}")
+
+async def stream_completion(client, request_id, **kwargs):
+    """
+    Run a streaming chat completion. Answer text is streamed to the session
+    of `request_id` as it arrives (pass None to not stream) until a tool
+    call shows up, which resets what was streamed; tool calls are
+    assembled from their deltas.
+    Returns (content, [(tool name, arguments json)], tokens used).
+    """
+    content = []
+    tool_calls = {}
+    tokens = 0
+    started = time.perf_counter()
+    first_token = True
+    streamed = False
+    with metrics.stage("llm", model=kwargs.get("model")):
+        stream = await client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs)
+        async for chunk in stream:
+            if chunk.usage is not None:
+                tokens = chunk.usage.total_tokens
+            if not chunk.choices:
+                continue
+            if first_token:
+                metrics.observe("llm_first_token", time.perf_counter() - started)
+                first_token = False
+            delta = chunk.choices[0].delta
+            if delta.tool_calls and streamed:
+                # The model wrote some text before handing off after all;
+                # take it back from the client
+                websocket.sessions.reset(request_id)
+                streamed = False
+            for call in delta.tool_calls or []:
+                name, arguments = tool_calls.get(call.index, ("", ""))
+                if call.function is not None:
+                    name += call.function.name or ""
+                    arguments += call.function.arguments or ""
+                tool_calls[call.index] = (name, arguments)
+            if delta.content:
+                content.append(delta.content)
+                # Once a tool call starts this hop is a hand-off, not the answer
+                if request_id is not None and not tool_calls:
+                    websocket.sessions.stream(request_id, delta.content)
+                    streamed = True
+    return "".join(content), [tool_calls[index] for index in sorted(tool_calls)], tokens
+
+def resolve_request(wallet, original, text, path=None):
+    """
+    Store the final answer for `wallet`'s current request and deliver it.
+    `path` is the hop path of the agent answering; inside a fan-out the
+    answer goes to its group instead, or nowhere once the group has closed.
+    """
+    found = fanouts.find(wallet, path, original) if path is not None else None
+    if found is not None:
+        group, branch = found
+        if group.closed_at is not None:
+            logger.info(f"Dropping late fan-out answer from {branch} for {wallet}")
+            return
+        group.add(branch, text)
+        return
+    request_id = journal.current_request(wallet, original)
+    if request_id is None or not journal.complete_request(request_id, text):
+        logger.warning(f"No pending request of {wallet} for this answer, dropping it")
+        return
+    budgets.forget(request_id)
+    websocket.sessions.resolve(request_id, text)
+
+def fail_request(wallet, original, path):
+    """
+    Give up on the request a failed hop belonged to, so later hops and
+    answers of the wallet aren't matched to it. Inside a fan-out only the
+    branch is given up.
+    """
+    found = fanouts.find(wallet, path, original)
+    if found is not None:
+        group, branch = found
+        group.fail(branch)
+        return
+    request_id = journal.current_request(wallet, original)
+    if request_id is not None and journal.fail_request(request_id, FAILED_REQUEST_MESSAGE):
+        budgets.forget(request_id)
+        websocket.sessions.resolve(request_id, FAILED_REQUEST_MESSAGE)
+
+async def collect_fanout(group):
+    """
+    Wait for a fan-out's branches and answer with their merged result.
+    """
+    responses = await group.wait()
+    fanouts.close(group)
+    request_id = journal.current_request(group.wallet, group.original)
+    # Only the outermost merge goes straight to the user
+    stream_to = request_id if fanouts.find(group.wallet, group.path, group.original) is None else None
+
+    async def complete(messages):
+        content, _, tokens = await stream_completion(http_client.get_openai(), stream_to, model="gpt-4o", messages=messages)
+        budgets.charge(request_id, tokens)
+        return content
+
+    agents = {branch: registry.get_by_address(branch) for branch in responses}
+    try:
+        text = await fanout.aggregate(group, responses, agents, complete)
+    except Exception as e:
+        logger.exception(f"Failed to merge fan-out answers: {e}")
+        text = next(iter(responses.values()), "Sorry, none of the agents answered in time.")
+    resolve_request(group.wallet, group.original, text, group.path)
+
+async def hand_off(me, wallet, data, original, hops, my_agent, next_name, next_input, max_hops, request_id=None):
+    """
+    Report this hop as finished to `request_id`'s client and forward the
+    request to `next_name`, which gets `max_hops` hops left.
+    """
+    console.print(f"[bold green]Next AI: {next_name}[/]")
+    next_agent = registry.get_by_id(next_name)
+    next_address = next_agent["address"]
+    
+    await asyncio.sleep(0.3 + random.uniform(0, 0.7))
+    await websocket.send_json(request_id, {
+        "type": "progress_finished",
+        "data": {
+            "wallet": wallet,
+            "input": data,
+            "original": original,
+            "hops": hops + [me],
+            "next": next_name,
+            "current_agent": my_agent,
+            "next_agent": next_agent,
+            "next_address": next_address
+        }
+    })
+    await forward_hop(me, wallet, next_input, original, hops + [me], next_address, max_hops)
 
-try:
-    oracle_contract = w3.eth.contract(address=os.getenv('ORACLE_ADDR'), abi=agent_abi)
-    logger.info("Oracle contract initialized.")
-except Exception as e:
-    console.print(f"[bold red]Failed to initialize oracle contract: {e}[/]")
-    raise
+PLACES_API_URL = os.getenv("PLACES_API_URL", "https://maps.googleapis.com/maps/api/place/textsearch/json")
 
 # Function to handle Google Maps API requests
-def query_google_maps(query, location=None):
+async def query_google_maps(query, location=None):
     try:
         api_key = os.getenv("GOOGLE_MAPS_API_KEY")
         
@@ -135,13 +308,14 @@ def query_google_maps(query, location=None):
         #             break
         
         # Places API request
-        base_url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+        base_url = PLACES_API_URL
         params = {
             "query": query,
             "key": api_key
         }
         
-        response = requests.get(base_url, params=params)
+        with metrics.stage("places"):
+            response = await http_client.get_client().get(base_url, params=params)
         places_data = response.json()
         
         if places_data["status"] != "OK":
@@ -166,17 +340,36 @@ def query_google_maps(query, location=None):
         logger.error(f"Error querying Google Maps API: {e}")
         return f"Sorry, I encountered an error while searching for places: {str(e)}"
 
-async def trigger_external_action(me, *args):
-    wallet = args[0]
-    data = args[1]
-    original = args[2]
-    hops = args[3]
-    agents = [a for a in db.list_agent() if a["address"] != me]
-    my_agent = [a for a in db.list_agent() if a["address"] == me][0]
-    hopnames = [agent["id"] for agent in agents if agent["address"] in hops] + [my_agent["id"]]
+async def trigger_external_action(me, wallet, data, original, hops, max_hops=budget.MAX_HOPS):
+    # A branch whose fan-out already merged has nobody left to answer to
+    found = fanouts.find(wallet, hops + [me], original)
+    if found is not None and found[0].closed_at is not None:
+        logger.info(f"Dropping hop of {me} for {wallet}: its fan-out has already closed")
+        return
+    
+    await registry.ensure_fresh()
+    my_agent = registry.get_by_address(me)
+    if my_agent is None:
+        # Possibly an agent added since the last load
+        await asyncio.to_thread(registry.refresh)
+        my_agent = registry.get_by_address(me)
+    if my_agent is None:
+        # Not one of ours; this is no reason to fail the wallet's request
+        logger.warning(f"Ignoring request for unknown agent {me} from {wallet}")
+        return
+    request_id = journal.current_request(wallet, original)
+    journal.record_hop(request_id, my_agent["id"])
+    excluded = frozenset(h.lower() for h in hops) | {me.lower()}
+    hopnames = [a["id"] for a in map(registry.get_by_address, hops) if a is not None] + [my_agent["id"]]
+    excluded_ids = frozenset(hopnames)
+    
+    # Out of hops, tokens or time: this agent has to answer itself
+    exhausted = budgets.exhausted(journal.get_request(request_id) if request_id else None, max_hops)
+    if exhausted:
+        logger.info(f"Budget for {wallet} exhausted ({exhausted}), {my_agent['id']} answers directly")
     
     # Start progress tracking
-    await websocket.send_json({
+    await websocket.send_json(request_id, {
             "type": "progress_started",
             "data": {
                 "wallet": wallet,
@@ -201,17 +394,19 @@ async def trigger_external_action(me, *args):
         else:
             query = data
         
-        # Query Google Maps API
-        text_response = query_google_maps(query, location)
+        # Query Google Maps API, unless we answered this recently
+        cached = await response_cache.get(my_agent["id"], data, original)
+        if cached is not None:
+            text_response = cached["response"]
+        else:
+            text_response = await query_google_maps(query, location)
+            if not text_response.startswith(("Error", "Sorry")):
+                await response_cache.put(my_agent["id"], data, original, {"response": text_response})
         console.print(f"[bold green]Google Maps Response: {text_response}[/]")
         
-        # Send response
-        websocket.result = text_response
-        await websocket.safe_discard(wallet.lower())
-        
         # Log completion
-        time.sleep(0.3 + random.uniform(0, 0.7))
-        await websocket.send_json({
+        await asyncio.sleep(0.3 + random.uniform(0, 0.7))
+        await websocket.send_json(request_id, {
             "type": "progress_finished",
             "data": {
                 "wallet": wallet,
@@ -223,123 +418,333 @@ async def trigger_external_action(me, *args):
             }
         })
         
+        # Send response
+        resolve_request(wallet, original, text_response, hops + [me])
+        
         return
     
     # Continue with regular OpenAI-based agent functionality for non-Google Maps agents
-    agents = [a for a in agents if a["address"] not in hops]
-    tools = [{
-		"type": "function",
-            "function": {
-                "name": agent["id"],
-                "description": agent["description"],
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "input": {
-                            "type": "string",
-                            "description": f"A text description detailing anything that could relate to {agent['id']}."
-                        }
-                    },
-                    "required": ["input"]
-                }
-            }        
-	} for agent in agents]
+    client = http_client.get_openai()
     
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    system_prompt = tool_catalog.system_prompt(my_agent, hopnames)
+    if fanout.FANOUT:
+        # Let the model split multi-domain requests across agents
+        system_prompt += ("\nIf the request spans several specialities, call every relevant tool at once, "
+                          "each with its own part of the request.")
     
-    system_prompt = (
-        f"NOT ALLOWED TOOLS: {','.join(hopnames)}."
-        "Respond to user by: (1) Defer to one of the ALLOWED tools, (2) directly respond to user if it fits within your boundaries."
-        "When deferring select the most helpful service."
-        f"Your skills include: {my_agent['description']}."
-    )
+    logger.debug(system_prompt)
     
-    print(system_prompt)
+    def allowed(name):
+        next_agent = registry.get_by_id(name)
+        return next_agent is not None and next_agent["address"].lower() not in excluded
     
-    response = client.chat.completions.create(
-        model="gpt-4o",
-		messages=[
-			{"role": "system", "content": system_prompt},
-			{"role": "user", "content": f"Context: {original}\nQuery: {data}"},
-		],
-		tools=tools,
-		tool_choice="auto"
-	)
+    # A cached hand-off is only reusable if those agents are still allowed here
+    decision = await response_cache.get(my_agent["id"], data, original)
+    if decision is not None and not all(allowed(branch["next"]) for branch in decision.get("fanout", [decision])
+                                        if "next" in branch):
+        decision = None
+    if decision is not None and "fanout" in decision and not fanout.FANOUT:
+        decision = decision["fanout"][0]
+    if decision is not None and exhausted and "response" not in decision:
+        decision = None
     
-    # Debug response
-    logger.info(f"Response tool calls: {response.choices[0].message.tool_calls}")
+    # Obvious hand-offs are routed locally without asking the LLM
+    route = None
+    if decision is None and not exhausted:
+        route = fast_router.route(data, my_agent["id"], excluded_ids)
+        if fast_router.should_skip_llm(route):
+            console.print(f"[bold green]Fast route: {route.agent_id} ({route.score:.2f})[/]")
+            fast_router.record(data, my_agent["id"], route, taken=True)
+            decision = {"next": route.agent_id, "input": data}
     
-    if response.choices[0].message.tool_calls:
-        next_name = response.choices[0].message.tool_calls[0].function.name
-        console.print(f"[bold green]Next AI: {next_name}[/]")
-        next_address = [agent["address"] for agent in agents if agent["id"] == next_name][0]
+    # Answers inside a fan-out branch are merged before the user sees them
+    # (and after the merge, dropped)
+    stream_to = request_id if fanouts.find(wallet, hops + [me], original) is None else None
+    
+    async def ask(direct):
+        # Streamed, so a final answer reaches the user token by token
+        options = {"tools": tools, "tool_choice": "auto"} if tools and not direct else {}
+        content, tool_calls, tokens = await stream_completion(
+            client,
+            stream_to,
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": system_prompt + (DIRECT_ANSWER_PROMPT if direct else "")},
+                {"role": "user", "content": f"Context: {original}\nQuery: {data}"},
+            ],
+            **options
+        )
+        budgets.charge(request_id, tokens)
+        return content, tool_calls
+    
+    if decision is None:
+        tools = tool_catalog.tools_for(excluded)
+        # Only offer the agents most relevant to this query
+        if not exhausted:
+            candidates = await agent_index.candidates(f"{original}\n{data}", excluded_ids)
+            if candidates is not None:
+                tools = [tool for tool in tools if tool["function"]["name"] in candidates]
         
-        time.sleep(0.3 + random.uniform(0, 0.7))
-        await websocket.send_json({
-            "type": "progress_finished",
-            "data": {
-                "wallet": wallet,
-                "input": data,
-                "original": original,
-                "hops": hops + [me],
-                "next": next_name,
-                "current_agent": my_agent,
-                "next_agent": [agent for agent in agents if agent["id"] == next_name][0],
-                "next_address": next_address
-            }
-        })
-        agent.call_contract_function(w3, wallet, eval(response.choices[0].message.tool_calls[0].function.arguments)["input"], original, hops + [me], logger, next_address)
+        content, tool_calls = await ask(direct=bool(exhausted))
+        
+        # Debug response
+        logger.info(f"Response tool calls: {tool_calls}")
+        
+        branches = {}
+        for name, arguments in tool_calls:
+            if name not in branches and allowed(name):
+                branches[name] = {"next": name, "input": json.loads(arguments)["input"]}
+        branches = list(branches.values())
+        if tool_calls and not branches:
+            # Never hand back to an agent already on the path
+            logger.warning(f"{my_agent['id']} tried to hand off to {[name for name, _ in tool_calls]}, "
+                           f"which are excluded; asking for a direct answer")
+            content, tool_calls = await ask(direct=True)
+        if fanout.FANOUT and len(branches) > 1:
+            decision = {"fanout": branches[:fanout.FANOUT_MAX_BRANCHES]}
+        elif branches:
+            decision = branches[0]
+        else:
+            decision = {"response": content}
+        # A forced answer only fits this request's budget, so don't reuse it
+        if not exhausted:
+            await response_cache.put(my_agent["id"], data, original, decision)
+        fast_router.record(data, my_agent["id"], route, taken=False, llm_choice=decision.get("next"))
+    
+    if "fanout" in decision:
+        # Branches run in parallel and answer to the group, which answers
+        # for this hop once they're done
+        addresses = [registry.get_by_id(branch["next"])["address"] for branch in decision["fanout"]]
+        console.print(f"[bold green]Fanning out to {', '.join(branch['next'] for branch in decision['fanout'])}[/]")
+        group = fanouts.open(wallet, hops + [me], addresses, original, collect_fanout)
+        results = await asyncio.gather(*(hand_off(me, wallet, data, original, hops, my_agent, branch["next"],
+                                                  branch["input"], max_hops - 1, request_id)
+                                         for branch in decision["fanout"]), return_exceptions=True)
+        for address, result in zip(addresses, results):
+            if isinstance(result, Exception):
+                logger.error(f"Hand-off to {address} failed: {result}")
+                group.fail(address)
+    elif "next" in decision:
+        await hand_off(me, wallet, data, original, hops, my_agent, decision["next"], decision["input"], max_hops - 1,
+                       request_id)
     else:
-        text_response = response.choices[0].message.content
+        text_response = decision["response"]
         console.print(f"[bold green]Response: {text_response}[/]")
-        websocket.result = text_response
-        console.print(f"[bold yellow]Discarding wallet: {wallet}[/]")
-        await websocket.safe_discard(wallet.lower())
+        console.print(f"[bold yellow]Resolving wallet: {wallet}[/]")
+        resolve_request(wallet, original, text_response, hops + [me])
     
     
 last_block_processed = 0
-    
+
+# The event topic and decoder never change, so build them once per process
+# instead of once per block.
+IRIS_EVENT_SIGNATURE = Web3.to_hex(Web3.keccak(text="IRISRequestAgentData(address,string,uint256,string,address[])"))
+iris_event = Web3().eth.contract(abi=agent_abi).events.IRISRequestAgentData()
+
+# Logs are only acted on once their block is CONFIRMATION_DEPTH blocks deep.
+# The hashes of the last REORG_WINDOW checkpoints are kept to notice when the
+# chain we scanned was replaced, so the scan can rewind to the fork point.
+CONFIRMATION_DEPTH = int(os.getenv("CONFIRMATION_DEPTH", 0))
+REORG_WINDOW = int(os.getenv("REORG_WINDOW", 64))
+
+# Adaptive eth_getLogs range: grows while the provider accepts ranges and
+# shrinks when it rejects one (too many results, range limit, timeout).
+MIN_LOG_CHUNK = 1
+MAX_LOG_CHUNK = int(os.getenv("MAX_LOG_CHUNK", 2000))
+log_chunk_size = min(int(os.getenv("INITIAL_LOG_CHUNK", 100)), MAX_LOG_CHUNK)
+
+# Hops run concurrently: in order per user, in parallel across users.
+dispatcher = Dispatcher()
+
 def set_initial_block():
     global last_block_processed
-    last_block_processed = w3.eth.block_number
+    # Resume from the journal; only a fresh install starts at the head
+    checkpoint = journal.get_checkpoint()
+    if checkpoint is not None:
+        last_block_processed = checkpoint
+        logger.info(f"Resuming after block {checkpoint}.")
+    else:
+        head = confirmed_head()
+        advance_checkpoint(head, get_block_hash(head))
 
-async def listen_for_contract_requests():
+def start():
+    """
+    Connect and prepare the oracle; called by the application context.
+    """
+    global hop_ledger
+    logs, requests = journal.prune()
+    if logs or requests:
+        logger.info(f"Pruned {logs} logs and {requests} requests from the journal")
+    agent_index.load()
+    metrics.watch_cache("response_cache", response_cache)
+    if offchain.OFFCHAIN_HOPS and hop_ledger is None:
+        hop_ledger = offchain.HopLedger(get_w3())
+    set_initial_block()
+
+def get_logs_in_range(from_block, to_block):
+    """
+    Fetch IRIS request logs for [from_block, to_block] in as few eth_getLogs
+    calls as the provider allows.
+    """
+    global log_chunk_size
+    logs = []
+    start = from_block
+    while start <= to_block:
+        end = min(start + log_chunk_size - 1, to_block)
+        try:
+            with metrics.stage("get_logs"):
+                logs.extend(get_w3().eth.get_logs({
+                    'fromBlock': start,
+                    'toBlock': end,
+                    'topics': [IRIS_EVENT_SIGNATURE]
+                }))
+        except Exception as e:
+            if log_chunk_size <= MIN_LOG_CHUNK:
+                raise
+            log_chunk_size = max(MIN_LOG_CHUNK, log_chunk_size // 2)
+            logger.warning(f"get_logs rejected blocks {start}-{end} ({e}), retrying with chunk size {log_chunk_size}")
+            continue
+        start = end + 1
+        log_chunk_size = min(MAX_LOG_CHUNK, log_chunk_size * 2)
+    return logs
+
+def submit_hop(key, me, wallet, data, original, hops, max_hops=budget.MAX_HOPS):
+    """
+    Queue the hop for a claimed log; `key` is its (blockHash, txHash, logIndex).
+    """
+    lane = fanouts.ordering_key(wallet, list(hops) + [me])
+    dispatcher.submit(lane, me, run_hop, key, me, wallet, data, original, hops, max_hops)
+
+async def run_hop(key, me, *args):
+    # A reorg may have orphaned the log while the hop waited in the queue
+    if not journal.start_log(*key):
+        logger.info(f"Dropping hop for orphaned log {key[1]}:{key[2]}")
+        return
+    try:
+        with metrics.stage("hop", agent=me, wallet=args[0], tx=key[1]):
+            await trigger_external_action(me, *args)
+    except Exception:
+        journal.finish_log(*key, status="failed")
+        wallet, _, original, hops = args[:4]
+        fail_request(wallet, original, list(hops) + [me])
+        raise
+    journal.finish_log(*key)
+
+def resume_pending():
+    """
+    Re-dispatch hops a previous process claimed but never finished. They
+    run again from the start, so one that already forwarded its request
+    forwards it again.
+    """
+    pending = journal.pending_logs()
+    if pending:
+        logger.info(f"Resuming {len(pending)} unfinished hops from the journal.")
+    for block_hash, tx_hash, log_index, contract, args in pending:
+        submit_hop((block_hash, tx_hash, log_index), contract, *args)
+
+def confirmed_head(head=None):
+    """
+    Newest block that is at least CONFIRMATION_DEPTH blocks deep.
+    """
+    if head is None:
+        head = get_w3().eth.block_number
+    return max(head - CONFIRMATION_DEPTH, 0)
+
+def advance_checkpoint(block, block_hash=None):
+    """
+    Mark every block up to `block` as processed, durably. Pass the block's
+    hash (hex) so later scans can detect a reorg.
+    """
     global last_block_processed
+    if block > last_block_processed:
+        last_block_processed = block
+        journal.set_checkpoint(block)
+        if block_hash is not None:
+            journal.set_block_hash(block, block_hash, REORG_WINDOW)
+
+def get_block_hash(number):
+    return Web3.to_hex(get_w3().eth.get_block(number)["hash"])
+
+def check_reorg():
+    """
+    Compare the recorded hashes of recent checkpoints with the chain and
+    rewind to the newest block that still matches. Queued hops from the
+    orphaned blocks are dropped; their logs are picked up again from the
+    new canonical blocks, where hops that already ran are not repeated.
+    Returns True if the checkpoint was rewound.
+    """
+    global last_block_processed
+    recent = journal.recent_blocks()
+    if not recent or recent[0][1] == get_block_hash(recent[0][0]):
+        return False
+    for number, recorded in recent[1:]:
+        if recorded == get_block_hash(number):
+            break
+    else:
+        number = recent[-1][0] - 1
+        logger.error(f"Reorg deeper than the {REORG_WINDOW} block window, rewinding to block {number}")
+    orphaned = journal.rewind(number)
+    logger.warning(f"Reorg detected: rewinding from block {last_block_processed} to {number}, "
+                   f"dropping {orphaned} queued hops")
+    last_block_processed = number
+    return True
+
+def orphan_log(log):
+    """
+    Handle a log the node reports as removed by a reorg.
+    """
+    key = (Web3.to_hex(log['blockHash']), Web3.to_hex(log['transactionHash']), log['logIndex'])
+    status = journal.orphan_log(*key)
+    if status in ("running", "done", "failed"):
+        logger.warning(f"Log {key[1]}:{key[2]} was reorged out after its hop ran ({status})")
+    elif status is not None:
+        logger.info(f"Dropped orphaned log {key[1]}:{key[2]}")
+
+async def process_log(log):
+    contract_address = log['address']
+    try:
+        event = iris_event.process_log(log)
+        logger.info(f"Event received from {contract_address}: {event}")
+        if event['event'] == 'IRISRequestAgentData':
+            argsdict = dict(event['args'])
+            args = [argsdict['userAddress'], argsdict['data'], argsdict['originalData'], list(argsdict['hops']),
+                    argsdict['max_hops']]
+            key = (Web3.to_hex(log['blockHash']), Web3.to_hex(log['transactionHash']), log['logIndex'])
+            # The journal starts every log's hop once, across restarts and
+            # reorgs too; a hop cut short by a crash is run again on resume,
+            # so hops are at-least-once
+            if not journal.claim_log(*key, log['blockNumber'], contract_address, args):
+                logger.info(f"Skipping already processed log {key[1]}:{key[2]}")
+                return
+            submit_hop(key, contract_address, *args)
+    except Exception as e:
+        logger.error(f"Failed to process event: {e}")
+        raise e
+
+def scan_confirmed_blocks():
+    """
+    Blocking part of a poll: rewind on reorgs and fetch the logs of every new
+    confirmed block. Returns (confirmed head, logs), or (None, []) if there
+    is nothing new.
+    """
+    check_reorg()
+    current_block = confirmed_head()
+    if current_block <= last_block_processed:
+        return None, []
+    logger.info(f"Checking blocks {last_block_processed+1} to {current_block}")
+    # Fetch the whole range in adaptive chunks rather than block by block
+    return current_block, get_logs_in_range(last_block_processed + 1, current_block)
+
+async def listen_for_contract_requests():
     try:        
-        # Check for new blocks
-        current_block = w3.eth.block_number
-        if current_block > last_block_processed:
-            logger.info(f"Checking blocks {last_block_processed+1} to {current_block}")
-            
-            # Loop through each new block
-            for block_num in range(last_block_processed + 1, current_block + 1):
-                # Get all logs with the IRISRequestAgentData event signature
-                event_signature = "0x" + w3.keccak(text="IRISRequestAgentData(address,string,uint256,string,address[])").hex()
-                logs = w3.eth.get_logs({
-                    'fromBlock': block_num,
-                    'toBlock': block_num,
-                    'topics': [event_signature]
-                })
-                
-                # Process each log
-                for log in logs:
-                    # Create a contract instance with the log's address
-                    contract_address = log['address']
-                    temp_contract = w3.eth.contract(address=contract_address, abi=agent_abi)
-                    
-                    # Process the event data
-                    try:
-                        event = temp_contract.events.IRISRequestAgentData().process_log(log)
-                        logger.info(f"Event received from {contract_address}: {event}")
-                        if event['event'] == 'IRISRequestAgentData':
-                            argsdict = dict(event['args'])
-                            await trigger_external_action(contract_address, argsdict['userAddress'], argsdict['data'], argsdict['originalData'], argsdict['hops'])
-                    except Exception as e:
-                        logger.error(f"Failed to process event: {e}")
-                        raise e
-            
-            # Update the last processed block
-            last_block_processed = current_block
+        # The RPC calls are synchronous, so keep them off the event loop
+        current_block, logs = await asyncio.to_thread(scan_confirmed_blocks)
+        for log in logs:
+            await process_log(log)
+        
+        # Update the last processed block
+        if current_block is not None:
+            advance_checkpoint(current_block, await asyncio.to_thread(get_block_hash, current_block))
     except Exception as e:
         console.print(f"[bold red]Error in listen_for_contract_requests: {e}[/]")
-        logger.exception("Exception occurred in listen_for_contract_requests.")
\ No newline at end of file
+        logger.exception("Exception occurred in listen_for_contract_requests.")
@@ -0,0 +1,94 @@
+"""
+Agent Registry
+--------------
+In-memory copy of the `agents` collection with O(1) lookups by address and id.
+
+The registry loads once, then stays current through a Firestore snapshot
+listener. If the listener can't be started or goes quiet, entries older than
+AGENT_REGISTRY_TTL seconds are reloaded on the next lookup.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import db
+import metrics
+
+logger = logging.getLogger("registry")
+
+
+class AgentRegistry:
+    def __init__(self, ttl=None):
+        self.ttl = ttl or float(os.getenv("AGENT_REGISTRY_TTL", 300))
+        self.lock = threading.Lock()
+        self.by_address = {}
+        self.by_id = {}
+        self.loaded_at = 0
+        self.watch = None
+        self.listeners = []
+
+    def start(self):
+        """
+        Load the registry and subscribe to changes.
+        """
+        self.refresh()
+        try:
+            self.watch = db.watch_agents(self.replace)
+            logger.info("Watching agents collection for changes.")
+        except Exception as e:
+            logger.warning(f"Agent listener unavailable, using {self.ttl}s TTL refresh: {e}")
+
+    def stop(self):
+        if self.watch is not None:
+            self.watch.unsubscribe()
+            self.watch = None
+
+    def refresh(self):
+        with metrics.stage("registry_refresh"):
+            agents = db.list_agent()
+        self.replace(agents)
+
+    def replace(self, agents):
+        # Called from the Firestore listener thread as well as the event loop.
+        by_address = {a["address"].lower(): a for a in agents if a.get("address")}
+        by_id = {a["id"]: a for a in agents}
+        with self.lock:
+            self.by_address = by_address
+            self.by_id = by_id
+            self.loaded_at = time.monotonic()
+        logger.info(f"Agent registry loaded {len(by_id)} agents.")
+        for listener in self.listeners:
+            try:
+                listener(agents)
+            except Exception as e:
+                logger.exception(f"Registry listener failed: {e}")
+
+    def on_change(self, listener):
+        """
+        Call `listener(agent_list)` now (if loaded) and after every reload.
+        """
+        self.listeners.append(listener)
+        if self.loaded_at:
+            listener(self.all())
+
+    def is_stale(self):
+        return time.monotonic() - self.loaded_at > self.ttl
+
+    async def ensure_fresh(self):
+        """
+        Reload off the event loop if the TTL has expired.
+        """
+        if self.is_stale():
+            await asyncio.to_thread(self.refresh)
+
+    def get_by_address(self, address):
+        return self.by_address.get(address.lower())
+
+    def get_by_id(self, id):
+        return self.by_id.get(id)
+
+    def all(self):
+        return list(self.by_id.values())
@@ -0,0 +1,120 @@
+"""
+Response Cache
+--------------
+Remembers what an agent did with a given `(agent id, data, originalData)`
+request, so repeats skip the LLM or Places call.
+
+The exact tier is an LRU bounded by RESPONSE_CACHE_SIZE entries. With
+RESPONSE_CACHE_SEMANTIC=1 a miss is also compared by embedding against the
+agent's cached requests and served when the cosine similarity reaches
+RESPONSE_CACHE_THRESHOLD. Entries expire after RESPONSE_CACHE_TTL seconds,
+overridable per agent id through RESPONSE_CACHE_AGENT_TTLS (a JSON object).
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import embeddings
+
+logger = logging.getLogger("response_cache")
+
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+class ResponseCache:
+    def __init__(self, max_entries=None, default_ttl=None, agent_ttls=None, semantic=None, threshold=None):
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+        self.default_ttl = default_ttl if default_ttl is not None else float(os.getenv("RESPONSE_CACHE_TTL", 300))
+        self.agent_ttls = agent_ttls if agent_ttls is not None else json.loads(os.getenv("RESPONSE_CACHE_AGENT_TTLS", "{}"))
+        self.semantic = semantic if semantic is not None else os.getenv("RESPONSE_CACHE_SEMANTIC", "0") == "1"
+        self.threshold = threshold or float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.95))
+        # key -> (value, expires_at, vector)
+        self.entries = OrderedDict()
+        # Embeddings computed on a miss, kept for the `put` that follows it.
+        self.pending_vectors = {}
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+
+    def key(self, agent_id, data, original):
+        return (agent_id, normalize(data), normalize(original))
+
+    def ttl_for(self, agent_id):
+        return float(self.agent_ttls.get(agent_id, self.default_ttl))
+
+    def get_exact(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def get_similar(self, agent_id, vector):
+        now = time.monotonic()
+        candidates = [(k, e) for k, e in self.entries.items() if k[0] == agent_id and e[2] is not None and e[1] >= now]
+        if not candidates:
+            return None
+        scores = np.stack([e[2] for _, e in candidates]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        key, entry = candidates[best]
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    async def get(self, agent_id, data, original):
+        """
+        Return the cached value for this request, or None on a miss.
+        """
+        key = self.key(agent_id, data, original)
+        value = self.get_exact(key)
+        if value is not None:
+            self.hits["exact"] += 1
+            return value
+        if self.semantic:
+            try:
+                vector = await embeddings.embed_one(f"{original}\n{data}")
+            except Exception as e:
+                logger.warning(f"Embedding lookup failed: {e}")
+            else:
+                if len(self.pending_vectors) >= self.max_entries:
+                    self.pending_vectors.clear()
+                self.pending_vectors[key] = vector
+                value = self.get_similar(agent_id, vector)
+                if value is not None:
+                    self.hits["semantic"] += 1
+                    return value
+        self.misses += 1
+        return None
+
+    async def put(self, agent_id, data, original, value):
+        key = self.key(agent_id, data, original)
+        vector = self.pending_vectors.pop(key, None)
+        if self.semantic and vector is None:
+            try:
+                vector = await embeddings.embed_one(f"{original}\n{data}")
+            except Exception as e:
+                logger.warning(f"Embedding failed, caching exact match only: {e}")
+        self.entries[key] = (value, time.monotonic() + self.ttl_for(agent_id), vector)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits["exact"] + self.hits["semantic"] + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits_exact": self.hits["exact"],
+            "hits_semantic": self.hits["semantic"],
+            "misses": self.misses,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,141 @@
+"""
+Client Sessions
+---------------
+Maps in-flight user requests to the websocket that made them.
+
+Sessions are keyed by the journal's request id. Hop events on chain only
+carry the user's wallet and original query, so the oracle looks up which
+pending request a hop belongs to (see `Journal.current_request`) and
+routes progress, streamed text and the final answer by that id. Two
+identical queries in flight from one wallet are told apart by age only.
+A client that reconnects with its request id takes over the session.
+
+Streamed answers are sent as `response_chunk` messages. The producer never
+waits on the socket: chunks are buffered and a per-session sender merges
+whatever piled up while the previous send was in flight, so a slow client
+gets fewer, larger messages (each at most STREAM_CHUNK_MAX characters).
+A `response_reset` message tells the client to discard what was streamed
+so far, for text that turned out not to be the answer.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+
+logger = logging.getLogger("sessions")
+
+STREAM_CHUNK_MAX = int(os.getenv("STREAM_CHUNK_MAX", 4096))
+
+
+class Session:
+    def __init__(self, wallet, websocket, request_id=None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.wallet = wallet.lower()
+        self.websocket = websocket
+        self.result = asyncio.get_running_loop().create_future()
+        self.chunks = []
+        self.streamer = None
+
+    async def send(self, payload):
+        try:
+            await self.websocket.send_json(payload)
+        except Exception as e:
+            logger.warning(f"Dropping message for {self.wallet}: {e}")
+
+    def stream(self, text):
+        """
+        Queue a piece of the answer for sending; never blocks.
+        """
+        self.chunks.append(text)
+        self.start_streamer()
+
+    def reset(self):
+        """
+        Take back the streamed text: unsent chunks are dropped and the
+        client is told to discard what it already got.
+        """
+        self.chunks.clear()
+        # None marks the reset in the queue, after any send in flight
+        self.chunks.append(None)
+        self.start_streamer()
+
+    def start_streamer(self):
+        if self.streamer is None or self.streamer.done():
+            self.streamer = asyncio.create_task(self.send_chunks())
+
+    async def send_chunks(self):
+        while self.chunks:
+            if self.chunks[0] is None:
+                del self.chunks[0]
+                await self.send({"type": "response_reset"})
+                continue
+            end = self.chunks.index(None) if None in self.chunks else len(self.chunks)
+            text = "".join(self.chunks[:end])
+            del self.chunks[:end]
+            for start in range(0, len(text), STREAM_CHUNK_MAX):
+                await self.send({"type": "response_chunk", "data": text[start:start + STREAM_CHUNK_MAX]})
+
+    async def flush(self):
+        """
+        Wait until every streamed chunk has been sent.
+        """
+        if self.streamer is not None:
+            await self.streamer
+
+
+class SessionManager:
+    def __init__(self):
+        self.by_request = {}
+
+    def open(self, wallet, websocket, request_id=None):
+        session = Session(wallet, websocket, request_id)
+        self.by_request[session.request_id] = session
+        return session
+
+    def close(self, session):
+        # A reconnect may have taken the request over already
+        if self.by_request.get(session.request_id) is session:
+            del self.by_request[session.request_id]
+        if not session.result.done():
+            session.result.cancel()
+        if session.streamer is not None:
+            session.streamer.cancel()
+
+    def get(self, request_id):
+        return self.by_request.get(request_id)
+
+    async def send(self, request_id, payload):
+        """
+        Send `payload` to the session waiting on `request_id`, if any.
+        """
+        session = self.get(request_id)
+        if session is not None:
+            await session.send(payload)
+
+    def stream(self, request_id, text):
+        """
+        Stream part of the answer to `request_id`'s session.
+        """
+        session = self.get(request_id)
+        if session is not None:
+            session.stream(text)
+
+    def reset(self, request_id):
+        """
+        Discard the text streamed to `request_id`'s session so far.
+        """
+        session = self.get(request_id)
+        if session is not None:
+            session.reset()
+
+    def resolve(self, request_id, text):
+        """
+        Deliver the final answer for `request_id`.
+        """
+        session = self.get(request_id)
+        if session is None:
+            logger.warning(f"No open session for request {request_id}, dropping response.")
+            return
+        if not session.result.done():
+            session.result.set_result(text)
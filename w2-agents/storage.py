@@ -0,0 +1,172 @@
+"""
+Agent Storage Backends
+----------------------
+The agent registry can live in Firestore (the default) or in a local SQL
+database, selected with IRIS_STORAGE:
+
+- firestore: the `agents` collection
+- sqlite:    IRIS_SQLITE_PATH (default agents.db, ":memory:" for tests/benchmarks)
+- postgres:  IRIS_POSTGRES_DSN, through psycopg2
+
+Every backend stores the same agent dicts (`id` plus document fields). The SQL
+backends index `address` and `id` so single lookups don't scan.
+"""
+
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger("storage")
+
+# Firestore accepts at most 500 writes per batch
+MAX_BATCH_WRITES = 500
+
+
+class AgentStore:
+    """
+    Interface shared by the storage backends.
+    """
+    def add_agents(self, agents):
+        """
+        Overwrite agents given as {id: agent}.
+        """
+        self.write({id: (agent, False) for id, agent in agents.items()})
+
+    def write(self, items):
+        """
+        Apply {id: (data, merge)}: merge=True updates fields, False replaces.
+        """
+        raise NotImplementedError
+
+    def list_agent(self):
+        raise NotImplementedError
+
+    def get_by_id(self, id):
+        raise NotImplementedError
+
+    def get_by_address(self, address):
+        raise NotImplementedError
+
+    def watch(self, callback):
+        """
+        Call `callback(agent_list)` on every change. Returns an object with
+        `unsubscribe()`. Backends without change feeds raise NotImplementedError.
+        """
+        raise NotImplementedError
+
+
+class FirestoreAgentStore(AgentStore):
+    def __init__(self, get_client, collection="agents"):
+        self.get_client = get_client
+        self.collection = collection
+
+    def to_agent(self, snapshot):
+        new_dict = snapshot.to_dict()
+        new_dict["id"] = snapshot.id
+        return new_dict
+
+    def write(self, items):
+        client = self.get_client()
+        items = list(items.items())
+        for start in range(0, len(items), MAX_BATCH_WRITES):
+            batch = client.batch()
+            for id, (data, merge) in items[start:start + MAX_BATCH_WRITES]:
+                batch.set(client.collection(self.collection).document(id), data, merge=merge)
+            batch.commit()
+
+    def list_agent(self):
+        return [self.to_agent(agent) for agent in self.get_client().collection(self.collection).stream()]
+
+    def get_by_id(self, id):
+        snapshot = self.get_client().collection(self.collection).document(id).get()
+        return self.to_agent(snapshot) if snapshot.exists else None
+
+    def get_by_address(self, address):
+        query = self.get_client().collection(self.collection).where("address", "==", address).limit(1)
+        return next((self.to_agent(s) for s in query.stream()), None)
+
+    def watch(self, callback):
+        def on_snapshot(docs, changes, read_time):
+            callback([self.to_agent(doc) for doc in docs])
+        return self.get_client().collection(self.collection).on_snapshot(on_snapshot)
+
+
+class SQLAgentStore(AgentStore):
+    """
+    Agents in one table: `id` primary key, lowercase `address` (indexed) and
+    the full agent as JSON in `data`.
+    """
+    def __init__(self, dialect="sqlite", path=None, dsn=None):
+        self.dialect = dialect
+        self.lock = threading.Lock()
+        if dialect == "postgres":
+            import psycopg2
+            self.connection = psycopg2.connect(dsn or os.getenv("IRIS_POSTGRES_DSN"))
+            self.placeholder = "%s"
+        else:
+            import sqlite3
+            self.connection = sqlite3.connect(path or os.getenv("IRIS_SQLITE_PATH", "agents.db"), check_same_thread=False)
+            self.placeholder = "?"
+        self.execute("CREATE TABLE IF NOT EXISTS agents (id TEXT PRIMARY KEY, address TEXT, data TEXT NOT NULL)")
+        self.execute("CREATE INDEX IF NOT EXISTS agents_address ON agents (address)")
+        self.connection.commit()
+
+    def execute(self, sql, params=()):
+        cursor = self.connection.cursor()
+        cursor.execute(sql.replace("?", self.placeholder), params)
+        return cursor
+
+    def row_to_agent(self, row):
+        agent = json.loads(row[0])
+        agent["id"] = row[1]
+        return agent
+
+    def write(self, items):
+        with self.lock:
+            try:
+                for id, (data, merge) in items.items():
+                    if merge:
+                        row = self.execute("SELECT data FROM agents WHERE id = ?", (id,)).fetchone()
+                        data = {**(json.loads(row[0]) if row else {}), **data}
+                    data = {k: v for k, v in data.items() if k != "id"}
+                    address = data.get("address")
+                    self.execute(
+                        "INSERT INTO agents (id, address, data) VALUES (?, ?, ?) "
+                        "ON CONFLICT (id) DO UPDATE SET address = excluded.address, data = excluded.data",
+                        (id, address.lower() if address else None, json.dumps(data)),
+                    )
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+
+    def list_agent(self):
+        with self.lock:
+            rows = self.execute("SELECT data, id FROM agents ORDER BY id").fetchall()
+            # End the read transaction (a no-op for sqlite)
+            self.connection.commit()
+        return [self.row_to_agent(row) for row in rows]
+
+    def get_by_id(self, id):
+        with self.lock:
+            row = self.execute("SELECT data, id FROM agents WHERE id = ?", (id,)).fetchone()
+            self.connection.commit()
+        return self.row_to_agent(row) if row else None
+
+    def get_by_address(self, address):
+        with self.lock:
+            row = self.execute("SELECT data, id FROM agents WHERE address = ?", (address.lower(),)).fetchone()
+            self.connection.commit()
+        return self.row_to_agent(row) if row else None
+
+
+def create_store(kind, get_firestore_client=None, **options):
+    """
+    Build a backend by name: "firestore", "sqlite" or "postgres".
+    """
+    if kind == "firestore":
+        return FirestoreAgentStore(get_firestore_client)
+    if kind in ("sqlite", "postgres"):
+        return SQLAgentStore(kind, **options)
+    raise ValueError(f"Unknown IRIS_STORAGE backend: {kind}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app modules are flat files in w2-agents/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,52 @@
+import asyncio
+
+from hexbytes import HexBytes
+from web3.exceptions import TransactionNotFound
+
+from agent import ReceiptWatcher
+
+
+class FakeEth:
+    def __init__(self, receipts):
+        self.receipts = receipts
+
+    def get_transaction_receipt(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(f"{tx_hash.hex()} not found")
+        return self.receipts[tx_hash]
+
+
+class FakeWeb3:
+    def __init__(self, receipts):
+        self.eth = FakeEth(receipts)
+
+
+def watch(receipts, timeout=60):
+    """
+    Track one transaction per receipt status in `receipts` (None for never
+    mined). Returns what each callback was called with.
+    """
+    hashes = [HexBytes(bytes([n]) * 32) for n in range(len(receipts))]
+    watcher = ReceiptWatcher(FakeWeb3({h: {"status": s} for h, s in zip(hashes, receipts) if s is not None}),
+                             poll_interval=0, timeout=timeout)
+    outcomes = []
+
+    async def run():
+        futures = [watcher.track(h, lambda receipt: outcomes.append(receipt["status"]),
+                                 lambda error: outcomes.append(type(error).__name__)) for h in hashes]
+        await asyncio.wait(futures)
+        await asyncio.sleep(0)
+    asyncio.run(run())
+    return outcomes
+
+
+def test_mined_transactions_succeed():
+    assert watch([1]) == [1]
+
+
+def test_reverted_transactions_fail():
+    assert watch([0, 1]) == ["RuntimeError", 1]
+
+
+def test_unmined_transactions_time_out():
+    assert watch([None], timeout=0) == ["TimeoutError"]
@@ -0,0 +1,37 @@
+import time
+
+from budget import BudgetTracker
+
+
+def request(age=0):
+    return {"request_id": "r", "created_at": time.time() - age}
+
+
+def test_hop_limit():
+    budgets = BudgetTracker(token_budget=0, time_budget=0)
+    assert budgets.exhausted(None, 2) is None
+    assert budgets.exhausted(None, 1) == "hop limit reached"
+    assert budgets.exhausted(request(), 0) == "hop limit reached"
+
+
+def test_token_budget():
+    budgets = BudgetTracker(token_budget=100, time_budget=0)
+    budgets.charge("r", 60)
+    assert budgets.exhausted(request(), 5) is None
+    budgets.charge("r", 40)
+    budgets.charge(None, 500)
+    assert budgets.exhausted(request(), 5) == "100 of 100 tokens spent"
+    budgets.forget("r")
+    assert budgets.exhausted(request(), 5) is None
+
+
+def test_time_budget():
+    budgets = BudgetTracker(token_budget=0, time_budget=30)
+    assert budgets.exhausted(request(age=10), 5) is None
+    assert budgets.exhausted(request(age=31), 5) == "older than 30s"
+
+
+def test_unlimited_budgets():
+    budgets = BudgetTracker(token_budget=0, time_budget=0)
+    budgets.charge("r", 10 ** 9)
+    assert budgets.exhausted(request(age=10 ** 6), 5) is None
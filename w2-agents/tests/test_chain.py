@@ -0,0 +1,97 @@
+import pytest
+
+import chain
+from chain import NonceManager
+
+
+class FakeEth:
+    def __init__(self, errors=(), pending_count=5):
+        self.errors = list(errors)
+        self.pending_count = pending_count
+        self.count_reads = 0
+        self.sent = []
+        self.chain_id = 1
+        self.gas_price = 100
+        self.account = self
+
+    def get_transaction_count(self, address, block):
+        self.count_reads += 1
+        return self.pending_count
+
+    def sign_transaction(self, tx, private_key):
+        return type("Signed", (), {"raw_transaction": tx, "hash": f"0x{tx['nonce']}"})
+
+    def send_raw_transaction(self, tx):
+        if self.errors:
+            raise ValueError(self.errors.pop(0))
+        self.sent.append(tx)
+        return f"0x{tx['nonce']}"
+
+
+class FakeWeb3:
+    def __init__(self, eth):
+        self.eth = eth
+
+
+class FakeFunction:
+    @staticmethod
+    def build_transaction(params):
+        return dict(params)
+
+
+@pytest.fixture(autouse=True)
+def fresh_registries(monkeypatch):
+    monkeypatch.setattr(chain, "chain_params", {})
+    monkeypatch.setattr(chain, "nonce_managers", {})
+
+
+def send(eth):
+    return chain.send_transaction(FakeWeb3(eth), FakeFunction, "0xWallet", "key")
+
+
+def test_nonces_are_sequential():
+    eth = FakeEth()
+    nonces = NonceManager(FakeWeb3(eth), "0xwallet")
+    assert [nonces.allocate() for _ in range(3)] == [5, 6, 7]
+    assert eth.count_reads == 1
+
+    eth.pending_count = 9
+    nonces.resync()
+    assert nonces.allocate() == 9
+    assert eth.count_reads == 2
+
+
+def test_send_allocates_without_reading_the_count():
+    eth = FakeEth()
+    assert [send(eth) for _ in range(3)] == ["0x5", "0x6", "0x7"]
+    assert eth.count_reads == 1
+
+
+def test_nonce_too_low_resyncs():
+    eth = FakeEth(errors=["nonce too low"])
+    send(eth)
+    eth.pending_count = 8
+    eth.errors = ["nonce too low"]
+    # Another sender used 6 and 7 meanwhile
+    assert send(eth) == "0x8"
+    assert eth.count_reads == 3
+
+
+def test_underpriced_bumps_the_gas_price():
+    eth = FakeEth(errors=["transaction underpriced"])
+    assert send(eth) == "0x5"
+    assert eth.sent[0]["gasPrice"] == 113
+
+
+def test_already_known_counts_as_sent():
+    eth = FakeEth(errors=["already known"])
+    assert send(eth) == "0x5"
+    assert eth.sent == []
+
+
+def test_failed_send_releases_the_nonce():
+    eth = FakeEth(errors=["insufficient funds"])
+    with pytest.raises(ValueError):
+        send(eth)
+    # The next send reads the count again instead of skipping nonce 5
+    assert send(eth) == "0x5"
@@ -0,0 +1,80 @@
+import asyncio
+
+from dispatcher import Dispatcher
+
+
+def test_hops_of_one_user_run_in_order():
+    async def run():
+        dispatcher = Dispatcher(max_concurrent=8, max_per_agent=8)
+        order = []
+
+        async def hop(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        # The first hop is the slowest, yet the user's hops still finish in order
+        for name, delay in (("first", 0.03), ("second", 0.01), ("third", 0)):
+            dispatcher.submit("0xUser", "0xagent", hop, name, delay)
+        await dispatcher.drain()
+        assert order == ["first", "second", "third"]
+    asyncio.run(run())
+
+
+def test_users_run_in_parallel():
+    async def run():
+        dispatcher = Dispatcher(max_concurrent=8, max_per_agent=8)
+        order = []
+
+        async def hop(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        dispatcher.submit("0xslow", "0xagent", hop, "slow", 0.03)
+        dispatcher.submit("0xfast", "0xagent", hop, "fast", 0)
+        await dispatcher.drain()
+        assert order == ["fast", "slow"]
+    asyncio.run(run())
+
+
+def test_busy_agent_leaves_global_slots_free():
+    async def run():
+        dispatcher = Dispatcher(max_concurrent=2, max_per_agent=1)
+        release = asyncio.Event()
+        done = []
+
+        async def hop(name, wait):
+            if wait:
+                await release.wait()
+            done.append(name)
+
+        # Two users queue on the same busy agent; the second must not hold
+        # the last global slot while it waits
+        dispatcher.submit("0xa", "0xbusy", hop, "busy 1", True)
+        dispatcher.submit("0xb", "0xbusy", hop, "busy 2", True)
+        await asyncio.sleep(0.01)
+        dispatcher.submit("0xc", "0xother", hop, "other", False)
+        await asyncio.sleep(0.01)
+        assert done == ["other"]
+
+        release.set()
+        await dispatcher.drain()
+        assert sorted(done) == ["busy 1", "busy 2", "other"]
+    asyncio.run(run())
+
+
+def test_failed_hop_does_not_block_the_user():
+    async def run():
+        dispatcher = Dispatcher(max_concurrent=2, max_per_agent=2)
+        done = []
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def hop():
+            done.append("next")
+
+        dispatcher.submit("0xa", "0xagent", fail)
+        dispatcher.submit("0xa", "0xagent", hop)
+        await dispatcher.drain()
+        assert done == ["next"]
+    asyncio.run(run())
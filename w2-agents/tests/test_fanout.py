@@ -0,0 +1,92 @@
+import asyncio
+
+import fanout
+from fanout import FanOut, FanOutTracker, weighted_vote
+
+
+async def collect(group):
+    pass
+
+
+def test_branch_of():
+    group = FanOut("0xWallet", ["0xGate", "0xA"], ["0xB", "0xC"], "query")
+    assert group.branch_of(["0xgate", "0xa", "0xB"]) == "0xb"
+    assert group.branch_of(["0xgate", "0xa", "0xc", "0xd"]) == "0xc"
+    # The fanning agent itself, other agents and other paths are outside it
+    assert group.branch_of(["0xgate", "0xa"]) is None
+    assert group.branch_of(["0xgate", "0xa", "0xd"]) is None
+    assert group.branch_of(["0xgate", "0xe", "0xb"]) is None
+
+
+def test_completes_when_every_branch_is_done():
+    async def run():
+        group = FanOut("0xw", ["0xa"], ["0xb", "0xc", "0xd"], "query", aggregator="synthesis")
+        group.add("0xb", "one")
+        group.fail("0xc")
+        assert not group.complete.is_set()
+        group.add("0xd", "two")
+        assert group.complete.is_set()
+        assert await group.wait() == {"0xb": "one", "0xd": "two"}
+    asyncio.run(run())
+
+
+def test_first_completes_on_first_answer():
+    async def run():
+        group = FanOut("0xw", ["0xa"], ["0xb", "0xc"], "query", aggregator="first")
+        group.fail("0xb")
+        assert not group.complete.is_set()
+        group.add("0xc", "answer")
+        assert group.complete.is_set()
+    asyncio.run(run())
+
+
+def test_closed_groups_catch_late_branches():
+    async def run():
+        tracker = FanOutTracker()
+        group = tracker.open("0xW", ["0xa"], ["0xb", "0xc"], "query", collect)
+        assert tracker.find("0xw", ["0xa", "0xb"], "query") == (group, "0xb")
+        tracker.close(group)
+
+        found = tracker.find("0xw", ["0xa", "0xc", "0xd"], "query")
+        assert found == (group, "0xc") and group.closed_at is not None
+        # Only for the same request, and never for lane ordering
+        assert tracker.find("0xw", ["0xa", "0xc"], "another query") is None
+        assert tracker.ordering_key("0xw", ["0xa", "0xc"]) == "0xw"
+
+        # A new group on the same path wins over the tombstone
+        again = tracker.open("0xw", ["0xa"], ["0xc"], "query", collect)
+        assert tracker.find("0xw", ["0xa", "0xc"], "query") == (again, "0xc")
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_tombstones_expire():
+    async def run():
+        tracker = FanOutTracker(tombstone_ttl=0)
+        old = tracker.open("0xw", ["0xa"], ["0xb"], "query", collect)
+        tracker.close(old)
+        new = tracker.open("0xw", ["0xz"], ["0xy"], "query", collect)
+        tracker.close(new)
+        assert tracker.closed == {"0xw": [new]}
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_weighted_vote():
+    responses = {"0xa": "Paris", "0xb": "  paris ", "0xc": "Lyon"}
+    assert weighted_vote(responses, {}) == "Paris"
+    assert weighted_vote(responses, {"0xc": 3.0}) == "Lyon"
+    # Ties go to the earliest answer
+    assert weighted_vote({"0xa": "Lyon", "0xb": "Paris"}, {}) == "Lyon"
+
+
+def test_aggregate_without_llm():
+    async def run():
+        group = FanOut("0xw", ["0xa"], ["0xb", "0xc"], "query", aggregator="vote")
+        # Dashboard accuracy is no weight
+        agents = {"0xb": {"accuracy": 40}, "0xc": {"accuracy": 90, "weight": 2}}
+        assert await fanout.aggregate(group, {"0xb": "yes", "0xc": "no"}, agents, None) == "no"
+        agents = {"0xb": {"accuracy": 40}, "0xc": {"accuracy": 90}}
+        assert await fanout.aggregate(group, {"0xb": "yes", "0xc": "no"}, agents, None) == "yes"
+        assert (await fanout.aggregate(group, {}, agents, None)).startswith("Sorry")
+    asyncio.run(run())
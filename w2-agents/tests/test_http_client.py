@@ -0,0 +1,68 @@
+import asyncio
+
+import httpx
+import pytest
+
+import http_client
+from http_client import RetryTransport
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+    monkeypatch.setattr(http_client.asyncio, "sleep", sleep)
+    return delays
+
+
+def fetch(responses, **options):
+    """
+    GET through a RetryTransport whose connection answers with `responses`
+    in turn. Returns the final status and the number of attempts.
+    """
+    attempts = []
+
+    def handler(request):
+        response = responses[len(attempts)]
+        attempts.append(request)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def run():
+        transport = RetryTransport(**options)
+        transport.transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return (await client.get("https://example.com/")).status_code
+    return asyncio.run(run()), len(attempts)
+
+
+def test_retries_retryable_statuses(delays):
+    status, attempts = fetch([httpx.Response(503), httpx.Response(502), httpx.Response(200)], backoff=1)
+    assert (status, attempts) == (200, 3)
+    assert len(delays) == 2 and 0.5 <= delays[0] <= 1.5 and 1 <= delays[1] <= 3
+
+
+def test_honours_retry_after(delays):
+    status, attempts = fetch([httpx.Response(429, headers={"Retry-After": "7"}), httpx.Response(200)])
+    assert (status, attempts) == (200, 2)
+    assert delays == [7.0]
+
+
+def test_gives_up_after_max_retries(delays):
+    status, attempts = fetch([httpx.Response(500)] * 3, max_retries=2)
+    assert (status, attempts) == (500, 3)
+
+
+def test_other_statuses_are_returned(delays):
+    assert fetch([httpx.Response(404)]) == (404, 1)
+    assert delays == []
+
+
+def test_retries_transport_errors(delays):
+    status, attempts = fetch([httpx.ConnectError("refused"), httpx.Response(200)])
+    assert (status, attempts) == (200, 2)
+    with pytest.raises(httpx.ConnectError):
+        fetch([httpx.ConnectError("refused")] * 2, max_retries=1)
@@ -0,0 +1,159 @@
+import sqlite3
+
+import pytest
+
+from journal import Journal
+
+ARGS = ["0xwallet", "input", "original", [], 20]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = Journal(str(tmp_path / "journal.db"))
+    yield journal
+    journal.close()
+
+
+def status(journal, block_hash, tx_hash="0xtx", log_index=0):
+    row = journal.fetchone("SELECT status FROM logs WHERE block_hash = ? AND tx_hash = ? AND log_index = ?",
+                           (block_hash, tx_hash, log_index))
+    return row[0] if row else None
+
+
+def test_claim_log_once(journal):
+    assert journal.claim_log("0xa", "0xtx", 0, 10, "0xagent", ARGS)
+    assert not journal.claim_log("0xa", "0xtx", 0, 10, "0xagent", ARGS)
+    assert journal.pending_logs() == [("0xa", "0xtx", 0, "0xagent", ARGS)]
+
+
+def test_start_log_skips_orphans(journal):
+    journal.claim_log("0xa", "0xtx", 0, 10, "0xagent", ARGS)
+    assert journal.orphan_log("0xa", "0xtx", 0) == "queued"
+    assert not journal.start_log("0xa", "0xtx", 0)
+
+    # The block came back after all
+    assert journal.claim_log("0xa", "0xtx", 0, 10, "0xagent", ARGS)
+    assert journal.start_log("0xa", "0xtx", 0)
+    # Resumed hops are started again
+    assert journal.start_log("0xa", "0xtx", 0)
+
+
+def test_reorg_reinclusion_runs_once(journal):
+    journal.claim_log("0xa", "0xtx", 3, 10, "0xagent", ARGS)
+    journal.start_log("0xa", "0xtx", 3)
+    journal.finish_log("0xa", "0xtx", 3)
+
+    # The transaction is mined again in a new block, at another log index
+    assert not journal.claim_log("0xb", "0xtx", 5, 11, "0xagent", ARGS)
+    assert journal.pending_logs() == []
+
+
+def test_reorg_reinclusion_of_queued_log(journal):
+    journal.claim_log("0xa", "0xtx", 3, 10, "0xagent", ARGS)
+    assert journal.rewind(9) == 1
+    assert status(journal, "0xa", log_index=3) == "orphaned"
+
+    # Its hop never started, so the new copy runs
+    assert journal.claim_log("0xb", "0xtx", 5, 11, "0xagent", ARGS)
+    assert [log[:3] for log in journal.pending_logs()] == [("0xb", "0xtx", 5)]
+
+
+def test_rewind(journal):
+    for number in range(8, 13):
+        journal.set_checkpoint(number)
+        journal.set_block_hash(number, f"0x{number}", window=64)
+    journal.claim_log("0xa", "0xtx", 0, 12, "0xagent", ARGS)
+    journal.claim_log("0xa", "0xtx", 1, 11, "0xagent", ARGS)
+    journal.start_log("0xa", "0xtx", 1)
+
+    assert journal.rewind(10) == 1
+    assert journal.get_checkpoint() == 10
+    assert journal.recent_blocks() == [(10, "0x10"), (9, "0x9"), (8, "0x8")]
+    assert status(journal, "0xa", log_index=0) == "orphaned"
+    # Running hops are left alone
+    assert status(journal, "0xa", log_index=1) == "running"
+
+
+def test_checkpoint_only_rewinds_explicitly(journal):
+    journal.set_checkpoint(10)
+    journal.set_checkpoint(5)
+    assert journal.get_checkpoint() == 10
+    journal.set_checkpoint(5, rewind=True)
+    assert journal.get_checkpoint() == 5
+
+
+def test_block_hash_window(journal):
+    for number in range(10):
+        journal.set_block_hash(number, f"0x{number}", window=3)
+    assert [number for number, _ in journal.recent_blocks()] == [9, 8, 7]
+
+
+def test_migrates_logs_without_block_hash(tmp_path):
+    path = str(tmp_path / "journal.db")
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE logs (
+            tx_hash TEXT NOT NULL,
+            log_index INTEGER NOT NULL,
+            block_number INTEGER,
+            contract TEXT,
+            args TEXT,
+            status TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (tx_hash, log_index)
+        );
+        CREATE INDEX logs_status ON logs (status);
+        INSERT INTO logs VALUES ('0xtx', 0, 10, '0xagent', '["0xwallet"]', 'pending', 1.0);
+        INSERT INTO logs VALUES ('0xtx', 1, 10, '0xagent', '["0xwallet"]', 'done', 1.0);
+    """)
+    connection.commit()
+    connection.close()
+
+    journal = Journal(path)
+    assert journal.pending_logs() == [("", "0xtx", 0, "0xagent", ["0xwallet"])]
+    assert status(journal, "", log_index=1) == "done"
+    journal.close()
+
+    # Opening it again leaves it as it is
+    journal = Journal(path)
+    assert len(journal.fetchall("SELECT * FROM logs")) == 2
+    journal.close()
+
+
+def test_requests_match_their_original_query(journal):
+    first = journal.open_request("0xWallet", "weather in Paris")
+    second = journal.open_request("0xwallet", "pizza near me")
+    assert journal.current_request("0xwallet") == first
+    assert journal.current_request("0xWALLET", "pizza near me") == second
+    assert journal.current_request("0xwallet", "something else") is None
+
+    journal.record_hop(second, "gateway")
+    assert journal.complete_request(second, "Try Luigi's")
+    # Answers to finished requests are refused
+    assert not journal.complete_request(second, "again")
+    assert not journal.fail_request(second, "too late")
+    request = journal.get_request(second)
+    assert (request["status"], request["hops"], request["result"]) == ("answered", ["gateway"], "Try Luigi's")
+
+    assert journal.fail_request(first, "Sorry")
+    assert journal.current_request("0xwallet") is None
+
+
+def test_prune_keeps_recent_and_unfinished_rows(journal):
+    journal.set_checkpoint(20)
+    for index, block in enumerate((10, 11, 12, 30)):
+        journal.claim_log("0xa", "0xtx", index, block, "0xagent", ARGS + [index])
+    journal.finish_log("0xa", "0xtx", 0)
+    journal.finish_log("0xa", "0xtx", 1)
+    journal.finish_log("0xa", "0xtx", 3)
+    old = journal.open_request("0xw", "old")
+    journal.complete_request(old, "answer")
+    waiting = journal.open_request("0xw", "waiting")
+    journal.execute("UPDATE logs SET updated_at = 0 WHERE log_index != 1")
+    journal.execute("UPDATE requests SET updated_at = 0")
+
+    assert journal.prune(retention_days=7) == (1, 1)
+    # Recently finished, still queued, and above the checkpoint
+    assert [status(journal, "0xa", log_index=index) for index in range(4)] == [None, "done", "queued", "done"]
+    assert journal.get_request(old) is None
+    assert journal.get_request(waiting)["status"] == "pending"
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+import offchain
+from offchain import HopLedger, merkle_root, record_hash, unsettled_leaves
+
+
+def leaf(n):
+    return Web3.keccak(text=str(n))
+
+
+def pair(a, b):
+    return Web3.keccak(b"".join(sorted([a, b])))
+
+
+def test_merkle_root():
+    a, b, c = leaf(1), leaf(2), leaf(3)
+    assert merkle_root([]) == b"\x00" * 32
+    assert merkle_root([a]) == a
+    # Pairs are sorted, so proofs don't need a direction bit
+    assert merkle_root([a, b]) == merkle_root([b, a]) == pair(a, b)
+    # An odd node is paired with itself
+    assert merkle_root([a, b, c]) == pair(pair(a, b), pair(c, c))
+
+
+def test_record_hash_is_canonical():
+    assert record_hash({"a": 1, "b": [2]}) == record_hash({"b": [2], "a": 1})
+
+
+def test_unsettled_leaves(tmp_path):
+    path = tmp_path / "hop_ledger.jsonl"
+    a, b, c = leaf(1).hex(), leaf(2).hex(), leaf(3).hex()
+    with open(path, "w") as f:
+        for entry in ({"type": "hop", "hash": a}, {"type": "hop", "hash": b},
+                      {"type": "batch", "leaves": [a]}, {"type": "hop", "hash": c}):
+            f.write(json.dumps(entry) + "\n")
+        # Cut short by a crash
+        f.write('{"type": "ho')
+
+    assert unsettled_leaves(str(path)) == [leaf(2), leaf(3)]
+    assert unsettled_leaves(str(tmp_path / "missing.jsonl")) == []
+
+
+class FakeContract:
+    class functions:
+        @staticmethod
+        def commitBatch(root, count):
+            return (root, count)
+
+
+class FakeEth:
+    @staticmethod
+    def contract(address, abi):
+        return FakeContract
+
+
+class FakeWeb3:
+    eth = FakeEth
+
+
+class FakeWatcher:
+    def __init__(self, error=None):
+        self.error = error
+
+    def track(self, tx_hash):
+        future = asyncio.get_running_loop().create_future()
+        if self.error is None:
+            future.set_result({"status": 1})
+        else:
+            future.set_exception(self.error)
+        return future
+
+
+def settle(tmp_path, monkeypatch, watcher):
+    path = tmp_path / "hop_ledger.jsonl"
+    monkeypatch.setattr(offchain.chain, "send_transaction", lambda *args: HexBytes(b"\x01" * 32))
+    monkeypatch.setattr(offchain.agent, "get_receipt_watcher", lambda w3: watcher)
+
+    async def run():
+        ledger = HopLedger(FakeWeb3, path=str(path), address="0x0000000000000000000000000000000000000001")
+        ledger.record("0xw", "0xa", "0xb", "input", "original", ["0xa"])
+        ledger.record("0xw", "0xb", "0xc", "input", "original", ["0xa", "0xb"])
+        return ledger, await ledger.settle()
+    ledger, tx_hash = asyncio.run(run())
+    return ledger, tx_hash, [json.loads(line)["type"] for line in open(path)]
+
+
+def test_settle_logs_mined_batches(tmp_path, monkeypatch):
+    ledger, tx_hash, types = settle(tmp_path, monkeypatch, FakeWatcher())
+    assert tx_hash is not None and ledger.pending == []
+    assert types == ["hop", "hop", "batch"]
+    assert unsettled_leaves(ledger.path) == []
+
+
+def test_failed_batch_stays_unsettled(tmp_path, monkeypatch):
+    ledger, tx_hash, types = settle(tmp_path, monkeypatch, FakeWatcher(RuntimeError("reverted")))
+    assert tx_hash is None and len(ledger.pending) == 2
+    assert types == ["hop", "hop"]
+    assert unsettled_leaves(ledger.path) == ledger.pending
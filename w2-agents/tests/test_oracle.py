@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+
+import oracle
+from fanout import FanOutTracker
+from journal import Journal
+from sessions import SessionManager
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, payload):
+        self.sent.append(payload)
+
+
+async def collect(group):
+    pass
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    journal = Journal(str(tmp_path / "journal.db"))
+    monkeypatch.setattr(oracle, "journal", journal)
+    monkeypatch.setattr(oracle, "fanouts", FanOutTracker())
+    monkeypatch.setattr(oracle.websocket, "sessions", SessionManager())
+    monkeypatch.setattr(oracle, "last_block_processed", 0)
+    yield journal
+    journal.close()
+
+
+def test_late_fanout_branch_is_dropped(journal):
+    async def run():
+        sessions = oracle.websocket.sessions
+        first = journal.open_request("0xW", "plan my trip")
+        first_session = sessions.open("0xW", FakeSocket(), first)
+        group = oracle.fanouts.open("0xw", ["0xgate", "0xa"], ["0xb", "0xc"], "plan my trip", collect)
+
+        oracle.resolve_request("0xw", "plan my trip", "flights", ["0xgate", "0xa", "0xb"])
+        assert group.responses == {"0xb": "flights"}
+        oracle.fanouts.close(group)
+        oracle.resolve_request("0xw", "plan my trip", "merged", ["0xgate", "0xa"])
+        assert await first_session.result == "merged"
+
+        # The wallet moves on; the slow branch must not answer the new request
+        second = journal.open_request("0xw", "plan my trip")
+        second_session = sessions.open("0xw", FakeSocket(), second)
+        oracle.resolve_request("0xw", "plan my trip", "hotels", ["0xgate", "0xa", "0xc"])
+        oracle.resolve_request("0xw", "plan my trip", "hotels, later", ["0xgate", "0xa", "0xc", "0xd"])
+        assert not second_session.result.done()
+        assert journal.get_request(second)["status"] == "pending"
+
+        oracle.resolve_request("0xw", "plan my trip", "new answer", ["0xgate"])
+        assert await second_session.result == "new answer"
+    asyncio.run(run())
+
+
+def test_answers_go_to_their_own_request(journal):
+    async def run():
+        sessions = oracle.websocket.sessions
+        slow = journal.open_request("0xw", "long question")
+        fast = journal.open_request("0xw", "short question")
+        slow_session = sessions.open("0xw", FakeSocket(), slow)
+        fast_session = sessions.open("0xw", FakeSocket(), fast)
+
+        oracle.resolve_request("0xw", "short question", "short answer", ["0xgate"])
+        assert await fast_session.result == "short answer"
+        assert not slow_session.result.done()
+    asyncio.run(run())
+
+
+def test_failed_hop_fails_its_request(journal):
+    async def run():
+        sessions = oracle.websocket.sessions
+        failed = journal.open_request("0xw", "first")
+        failed_session = sessions.open("0xw", FakeSocket(), failed)
+        oracle.fail_request("0xw", "first", ["0xgate", "0xa"])
+        assert await failed_session.result == oracle.FAILED_REQUEST_MESSAGE
+        assert journal.get_request(failed)["status"] == "failed"
+
+        # A straggler of the failed chain doesn't take over the next request
+        following = journal.open_request("0xw", "second")
+        oracle.resolve_request("0xw", "first", "late", ["0xgate", "0xa", "0xb"])
+        assert journal.current_request("0xw") == following
+        assert journal.get_request(failed)["result"] == oracle.FAILED_REQUEST_MESSAGE
+    asyncio.run(run())
+
+
+def test_failed_branch_only_fails_the_branch(journal):
+    async def run():
+        request = journal.open_request("0xw", "query")
+        group = oracle.fanouts.open("0xw", ["0xgate"], ["0xa", "0xb"], "query", collect)
+        oracle.fail_request("0xw", "query", ["0xgate", "0xa"])
+        assert group.failed == {"0xa"}
+        assert journal.get_request(request)["status"] == "pending"
+    asyncio.run(run())
+
+
+def test_check_reorg(journal, monkeypatch):
+    chain = {number: f"0x{number}" for number in range(8, 13)}
+    monkeypatch.setattr(oracle, "get_block_hash", lambda number: chain[number])
+    for number in range(8, 13):
+        oracle.advance_checkpoint(number, chain[number])
+    journal.claim_log("0x12", "0xtx", 0, 12, "0xagent", ["0xw", "q", "q", [], 20])
+
+    assert not oracle.check_reorg()
+
+    chain[11], chain[12] = "0x11b", "0x12b"
+    assert oracle.check_reorg()
+    assert oracle.last_block_processed == 10
+    assert journal.get_checkpoint() == 10
+    assert journal.pending_logs() == []
+    assert not oracle.check_reorg()
+
+
+def test_check_reorg_beyond_window(journal, monkeypatch):
+    chain = {number: f"0x{number}" for number in range(8, 11)}
+    monkeypatch.setattr(oracle, "get_block_hash", lambda number: chain[number])
+    for number in range(8, 11):
+        oracle.advance_checkpoint(number, chain[number])
+
+    chain.update({number: f"0x{number}b" for number in chain})
+    assert oracle.check_reorg()
+    assert oracle.last_block_processed == 7
+
+
+class Delta:
+    def __init__(self, content=None, tool_calls=None):
+        self.content = content
+        self.tool_calls = tool_calls
+
+
+class Chunk:
+    def __init__(self, delta=None, usage=None):
+        self.choices = [type("Choice", (), {"delta": delta})] if delta else []
+        self.usage = usage
+
+
+class ToolCall:
+    def __init__(self, index, name=None, arguments=None):
+        self.index = index
+        self.function = type("Function", (), {"name": name, "arguments": arguments})
+
+
+class FakeClient:
+    def __init__(self, chunks):
+        async def create(**kwargs):
+            async def stream():
+                for chunk in chunks:
+                    yield chunk
+            return stream()
+        self.chat = type("Chat", (), {"completions": type("Completions", (), {"create": staticmethod(create)})})
+
+
+def test_stream_completion_takes_back_text_before_a_tool_call(journal):
+    async def run():
+        sessions = oracle.websocket.sessions
+        socket = FakeSocket()
+        sessions.open("0xw", socket, "request")
+        client = FakeClient([
+            Chunk(Delta("Let me ask ")),
+            Chunk(Delta("someone.")),
+            Chunk(Delta(tool_calls=[ToolCall(0, "google_maps", '{"input": ')])),
+            Chunk(Delta(tool_calls=[ToolCall(0, None, '"pizza"}')])),
+            Chunk(usage=type("Usage", (), {"total_tokens": 42})),
+        ])
+        content, tool_calls, tokens = await oracle.stream_completion(client, "request", model="gpt-4o", messages=[])
+        await sessions.get("request").flush()
+        assert tool_calls == [("google_maps", '{"input": "pizza"}')] and tokens == 42
+        assert socket.sent[-1] == {"type": "response_reset"}
+    asyncio.run(run())
@@ -0,0 +1,56 @@
+import asyncio
+
+import response_cache
+from response_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def cache(monkeypatch, **options):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    return ResponseCache(semantic=False, **options), clock
+
+
+def test_keys_are_normalised(monkeypatch):
+    async def run():
+        responses, _ = cache(monkeypatch)
+        await responses.put("agent", "Pizza  in Rome", "Dinner?", "answer")
+        assert await responses.get("agent", "pizza in rome", " dinner? ") == "answer"
+        assert await responses.get("other agent", "pizza in rome", "dinner?") is None
+        assert responses.stats()["hits_exact"] == 1 and responses.stats()["misses"] == 1
+    asyncio.run(run())
+
+
+def test_least_recently_used_is_evicted(monkeypatch):
+    async def run():
+        responses, _ = cache(monkeypatch, max_entries=2)
+        await responses.put("agent", "a", "q", "A")
+        await responses.put("agent", "b", "q", "B")
+        # Reading "a" makes "b" the oldest
+        assert await responses.get("agent", "a", "q") == "A"
+        await responses.put("agent", "c", "q", "C")
+        assert await responses.get("agent", "b", "q") is None
+        assert await responses.get("agent", "a", "q") == "A"
+        assert await responses.get("agent", "c", "q") == "C"
+    asyncio.run(run())
+
+
+def test_entries_expire(monkeypatch):
+    async def run():
+        responses, clock = cache(monkeypatch, default_ttl=60, agent_ttls={"places": 600})
+        await responses.put("agent", "a", "q", "A")
+        await responses.put("places", "a", "q", "P")
+        clock.now += 61
+        assert await responses.get("agent", "a", "q") is None
+        assert await responses.get("places", "a", "q") == "P"
+        assert responses.stats()["entries"] == 1
+        clock.now += 600
+        assert await responses.get("places", "a", "q") is None
+    asyncio.run(run())
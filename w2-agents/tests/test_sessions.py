@@ -0,0 +1,107 @@
+import asyncio
+
+import sessions
+from sessions import Session, SessionManager
+
+
+class Socket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, payload):
+        self.sent.append(payload)
+
+
+def test_messages_go_to_their_request():
+    async def run():
+        manager = SessionManager()
+        slow, fast = Socket(), Socket()
+        slow_session = manager.open("0xW", slow, "slow")
+        fast_session = manager.open("0xw", fast, "fast")
+
+        await manager.send("fast", {"type": "progress_started"})
+        manager.resolve("fast", "short answer")
+        assert fast.sent == [{"type": "progress_started"}] and slow.sent == []
+        assert await fast_session.result == "short answer"
+        assert not slow_session.result.done()
+        # Nobody waits on an unknown request
+        manager.resolve("missing", "lost")
+    asyncio.run(run())
+
+
+def test_reconnect_takes_over_the_session():
+    async def run():
+        manager = SessionManager()
+        old = manager.open("0xw", Socket(), "request")
+        new = manager.open("0xw", Socket(), "request")
+        # The old connection closing must not unregister the new one
+        manager.close(old)
+        assert manager.get("request") is new
+        manager.resolve("request", "answer")
+        assert await new.result == "answer"
+    asyncio.run(run())
+
+
+class SlowSocket:
+    """
+    A client whose every send takes a moment.
+    """
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, payload):
+        await asyncio.sleep(0.01)
+        self.sent.append(payload)
+
+
+def chunks(socket):
+    return [payload["data"] for payload in socket.sent if payload["type"] == "response_chunk"]
+
+
+def test_chunks_pile_up_while_a_send_is_in_flight():
+    async def run():
+        socket = SlowSocket()
+        session = Session("0xw", socket)
+        for word in ("one", " two", " three"):
+            session.stream(word)
+        await session.flush()
+        session.stream(" four")
+        await session.flush()
+        # The first send takes everything queued meanwhile
+        assert chunks(socket) == ["one two three", " four"]
+    asyncio.run(run())
+
+
+def test_long_text_is_split(monkeypatch):
+    monkeypatch.setattr(sessions, "STREAM_CHUNK_MAX", 4)
+
+    async def run():
+        socket = SlowSocket()
+        session = Session("0xw", socket)
+        session.stream("abcdefghij")
+        await session.flush()
+        assert chunks(socket) == ["abcd", "efgh", "ij"]
+    asyncio.run(run())
+
+
+def test_reset_drops_unsent_text():
+    async def run():
+        socket = SlowSocket()
+        session = Session("0xw", socket)
+        session.stream("Let me")
+        await asyncio.sleep(0)
+        # "Let me" is on its way, " check" is not yet
+        session.stream(" check")
+        session.reset()
+        session.stream("Answer")
+        await session.flush()
+        assert [payload["type"] for payload in socket.sent] == ["response_chunk", "response_reset", "response_chunk"]
+        assert chunks(socket) == ["Let me", "Answer"]
+    asyncio.run(run())
+
+
+def test_flush_without_stream():
+    async def run():
+        session = Session("0xw", SlowSocket())
+        await session.flush()
+    asyncio.run(run())
@@ -0,0 +1,39 @@
+from storage import SQLAgentStore, create_store
+
+
+def test_add_and_look_up():
+    store = SQLAgentStore(path=":memory:")
+    store.add_agents({"a": {"name": "A", "address": "0xAbC"}, "b": {"name": "B"}})
+    assert store.list_agent() == [{"name": "A", "address": "0xAbC", "id": "a"}, {"name": "B", "id": "b"}]
+    assert store.get_by_id("b") == {"name": "B", "id": "b"}
+    assert store.get_by_id("missing") is None
+    # Addresses match whatever their case
+    assert store.get_by_address("0xABC")["id"] == "a"
+
+
+def test_merge_keeps_other_fields():
+    store = SQLAgentStore(path=":memory:")
+    store.add_agents({"a": {"name": "A", "address": "0xabc", "speed": 50}})
+    store.write({"a": ({"speed": 80, "address": "0xdef"}, True), "new": ({"name": "N"}, True)})
+    assert store.get_by_id("a") == {"name": "A", "address": "0xdef", "speed": 80, "id": "a"}
+    assert store.get_by_address("0xdef")["id"] == "a" and store.get_by_address("0xabc") is None
+    # Merging into a missing agent creates it
+    assert store.get_by_id("new") == {"name": "N", "id": "new"}
+
+
+def test_overwrite_replaces_the_document():
+    store = create_store("sqlite", path=":memory:")
+    store.add_agents({"a": {"name": "A", "speed": 50}})
+    store.write({"a": ({"name": "A2", "id": "ignored"}, False)})
+    assert store.get_by_id("a") == {"name": "A2", "id": "a"}
+
+
+def test_failed_write_rolls_back():
+    store = SQLAgentStore(path=":memory:")
+    store.add_agents({"a": {"name": "A"}})
+    try:
+        store.write({"a": ({"name": "changed"}, False), "b": ({"value": object()}, False)})
+    except TypeError:
+        pass
+    assert store.get_by_id("a") == {"name": "A", "id": "a"}
+    assert store.get_by_id("b") is None
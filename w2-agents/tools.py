@@ -0,0 +1,77 @@
+"""
+Tool Catalog
+------------
+Precompiled OpenAI tool definitions and system prompts for every agent.
+
+Definitions are rebuilt only when the registry changes. Per hop we just drop
+the excluded agents with a set lookup; the surviving tools keep a stable
+order and the system prompt puts the per-agent text first and the per-hop
+exclusions last, so repeated requests share a long prompt prefix that the
+provider can cache.
+"""
+
+import logging
+
+logger = logging.getLogger("tools")
+
+
+def tool_definition(agent):
+    return {
+        "type": "function",
+        "function": {
+            "name": agent["id"],
+            "description": agent["description"],
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "input": {
+                        "type": "string",
+                        "description": f"A text description detailing anything that could relate to {agent['id']}."
+                    }
+                },
+                "required": ["input"]
+            }
+        }
+    }
+
+
+def prompt_prefix(agent):
+    return (
+        f"Your skills include: {agent['description']}."
+        "Respond to user by: (1) Defer to one of the ALLOWED tools, (2) directly respond to user if it fits within your boundaries."
+        "When deferring select the most helpful service."
+    )
+
+
+class ToolCatalog:
+    def __init__(self, registry, max_cached=1024):
+        self.max_cached = max_cached
+        # (tools, prompts, tool lists by exclusion set), swapped as one so a
+        # rebuild on the listener thread never mixes old and new entries.
+        self.state = ([], {}, {})
+        registry.on_change(self.rebuild)
+
+    def rebuild(self, agents):
+        agents = sorted((a for a in agents if a.get("address")), key=lambda a: a["id"])
+        tools = [(a["address"].lower(), tool_definition(a)) for a in agents]
+        prompts = {a["id"]: prompt_prefix(a) for a in agents}
+        self.state = (tools, prompts, {})
+        logger.info(f"Compiled {len(tools)} agent tools.")
+
+    def tools_for(self, excluded_addresses):
+        """
+        Tool list without the agents in `excluded_addresses`, a frozenset of
+        lowercase addresses. Results are shared between calls; don't mutate.
+        """
+        tools, _, cache = self.state
+        result = cache.get(excluded_addresses)
+        if result is None:
+            if len(cache) >= self.max_cached:
+                cache.clear()
+            result = cache[excluded_addresses] = [tool for address, tool in tools if address not in excluded_addresses]
+        return result
+
+    def system_prompt(self, agent, excluded_names):
+        _, prompts, _ = self.state
+        prefix = prompts.get(agent["id"]) or prompt_prefix(agent)
+        return prefix + f"NOT ALLOWED TOOLS: {','.join(excluded_names)}."
@@ -1,84 +1,89 @@
-from fastapi import FastAPI, WebSocket
-import asyncio
+from fastapi import FastAPI, Response, WebSocket
 import json
 import logging
 import os
 import agent
-import copy
-from web3 import Web3
+import metrics
+import oracle
+from sessions import SessionManager
 
 # dotenv
 from dotenv import load_dotenv
 load_dotenv()
 
-import oracle
-
-import asyncio
-
-# Atomic String:
-result = ""
-
-current_websocket = None
+from context import context
 
-active_sockets = set()
-set_lock = asyncio.Lock()
-
-async def safe_add(item):
-    async with set_lock:
-        active_sockets.add(item)
-
-async def safe_contains(item):
-    async with set_lock:
-        return item in active_sockets
-
-async def safe_discard(item):
-    async with set_lock:
-        active_sockets.discard(item)
+# In-flight requests, routed by request id
+sessions = SessionManager()
 
 app = FastAPI()
 
 logger = logging.getLogger("websocket")
 
-async def send_json(json):
-    global current_websocket
-    if current_websocket:
-        await current_websocket.send_json(json)
+SUBMIT_FAILED_MESSAGE = "Sorry, your request could not be submitted."
+
+async def send_json(request_id, json):
+    await sessions.send(request_id, json)
 
-async def background_loop():
-    oracle.set_initial_block()
-    while True:
-        await oracle.listen_for_contract_requests()
-        await asyncio.sleep(0.2)
-        
 @app.on_event("startup")
-async def start_background_loop():
-    asyncio.create_task(background_loop())
+async def startup():
+    await context.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await context.stop()
+
+@app.get("/metrics")
+async def get_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    global current_websocket
     await websocket.accept()
-    current_websocket = websocket
     data = json.loads(await websocket.receive_text())
-    try:
-        w3 = Web3(Web3.HTTPProvider(f"https://eth-sepolia.g.alchemy.com/v2/{os.getenv('ALCHEMY_API_KEY')}"))
-        logger.info("Connected to Web3 provider.")
-    except Exception as e:
-        logger.error(f"Failed to connect to Web3 provider: {e}")
-        raise e
-    data_wallet = data.get("wallet")
-    data_input = data.get("input")
-    await safe_add(data_wallet)
-    agent.call_contract_function(w3, data_wallet, data_input, data_input, [], logger, os.getenv("GATEWAY_ADDR"))
     
-    while await safe_contains(data_wallet):
-        await asyncio.sleep(1)
+    # A client that lost its connection can pick its request back up
+    resumed = oracle.journal.get_request(data["request_id"]) if data.get("request_id") else None
+    if resumed is not None and resumed["status"] != "pending":
+        await websocket.send_json({
+            "type": "response",
+            "data": resumed["result"]
+        })
+        await websocket.close()
+        return
+    
+    data_wallet = resumed["wallet"] if resumed else data.get("wallet")
+    data_input = data.get("input")
+    request_id = resumed["request_id"] if resumed else oracle.journal.open_request(data_wallet, data_input)
+    session = sessions.open(data_wallet, websocket, request_id)
+    try:
+        # The whole request, submit to final answer, is one span
+        with metrics.stage("request", request_id=request_id, wallet=data_wallet):
+            await session.send({
+                "type": "request_started",
+                "data": {"request_id": request_id}
+            })
+            if resumed is None:
+                def on_failure(error):
+                    # Reverted or never mined: no agent will ever pick it up
+                    if oracle.journal.fail_request(request_id, SUBMIT_FAILED_MESSAGE):
+                        sessions.resolve(request_id, SUBMIT_FAILED_MESSAGE)
+                
+                # Reuse the shared provider and return as soon as the request is broadcast
+                submitted = await agent.submit_contract_function(context.get_w3(), data_wallet, data_input, data_input, [], logger, os.getenv("GATEWAY_ADDR"), on_failure=on_failure)
+                if submitted is None:
+                    oracle.journal.fail_request(request_id, SUBMIT_FAILED_MESSAGE)
+                    session.result.set_result(SUBMIT_FAILED_MESSAGE)
         
-    my_result = copy.deepcopy(result)
-    await websocket.send_json({
-        "type": "response",
-        "data": my_result
-    })
-    current_websocket = None
+            my_result = await session.result
+            # Streamed chunks always arrive before the final message
+            await session.flush()
+            await websocket.send_json({
+                "type": "response",
+                "data": my_result
+            })
+    finally:
+        sessions.close(session)
     await websocket.close()
-    print("WebSocket closed.")
\ No newline at end of file
+    print("WebSocket closed.")
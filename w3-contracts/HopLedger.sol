@@ -0,0 +1,35 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+
+/**
+ * @title HopLedger
+ * @dev Settlement record for agent hops that were forwarded off-chain.
+ * The oracle commits the Merkle root of each batch of hop records; the
+ * records themselves are kept in the oracle's audit log.
+ */
+contract HopLedger {
+
+    address public owner;
+
+    // Merkle root => block timestamp it was committed at
+    mapping(bytes32 => uint256) public committedAt;
+
+    event HopBatchCommitted(bytes32 indexed root, uint256 count);
+
+    constructor() {
+        owner = msg.sender;
+    }
+
+    /**
+     * @dev Commits a batch of hop records
+     * @param root Merkle root of the batch's record hashes
+     * @param count Number of records in the batch
+     */
+    function commitBatch(bytes32 root, uint256 count) public {
+        require(msg.sender == owner, "Only the owner can commit hop batches");
+        require(committedAt[root] == 0, "Batch already committed");
+
+        committedAt[root] = block.timestamp;
+        emit HopBatchCommitted(root, count);
+    }
+}